@@ -0,0 +1,29 @@
+"""create cardevent
+
+Revision ID: 2c6b8e0f41a7
+Revises: e4a9d5c07b18
+Create Date: 2026-10-18 20:02:51.337460
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "2c6b8e0f41a7"
+down_revision = "e4a9d5c07b18"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "cardevent",
+        sa.Column("idempotency_key", sa.String, primary_key=True),
+        sa.Column("employee_id", sa.Integer, sa.ForeignKey("employee.id")),
+        sa.Column("tapped_at", sa.DateTime),
+        sa.Column("processed_at", sa.DateTime),
+    )
+
+
+def downgrade():
+    op.drop_table("cardevent")
@@ -0,0 +1,40 @@
+"""add work_date to timeclock
+
+Revision ID: 5b1e7f3a9c2d
+Revises: c42ddfb0d23a
+Create Date: 2026-10-18 19:24:10.512330
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "5b1e7f3a9c2d"
+down_revision = "c42ddfb0d23a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("timeclock", sa.Column("work_date", sa.Date, nullable=True))
+    op.execute("UPDATE timeclock SET work_date = DATE(check_in) WHERE check_in IS NOT NULL")
+
+    op.create_index("idx_employee_uid", "employee", ["uid"])
+    op.create_index(
+        "idx_time_clock_employee_work_date",
+        "timeclock",
+        ["employee_id", "work_date", "check_out"],
+    )
+    op.create_index(
+        "idx_time_clock_employee_check_in",
+        "timeclock",
+        ["employee_id", "check_in"],
+    )
+
+
+def downgrade():
+    op.drop_index("idx_time_clock_employee_check_in", table_name="timeclock")
+    op.drop_index("idx_time_clock_employee_work_date", table_name="timeclock")
+    op.drop_index("idx_employee_uid", table_name="employee")
+    with op.batch_alter_table("timeclock") as batch_op:
+        batch_op.drop_column("work_date")
@@ -0,0 +1,50 @@
+"""create dailyworkingtime
+
+Revision ID: 8d3f2a61c7e4
+Revises: 5b1e7f3a9c2d
+Create Date: 2026-10-18 19:32:44.108215
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "8d3f2a61c7e4"
+down_revision = "5b1e7f3a9c2d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "dailyworkingtime",
+        sa.Column("employee_id", sa.String, sa.ForeignKey("employee.id"), primary_key=True),
+        sa.Column("work_date", sa.Date, primary_key=True),
+        sa.Column("worked", sa.Float, default=0),
+        sa.Column("break_count", sa.Integer, default=0),
+        sa.Column("break_total", sa.Float, default=0),
+        sa.Column("first_check_in", sa.DateTime),
+        sa.Column("last_check_out", sa.DateTime),
+    )
+    # breaks are the gaps between the closed entries of a day
+    op.execute(
+        """
+        INSERT INTO dailyworkingtime
+            (employee_id, work_date, worked, break_count, break_total,
+             first_check_in, last_check_out)
+        SELECT employee_id,
+               work_date,
+               SUM(total),
+               COUNT(*) - 1,
+               (julianday(MAX(check_out)) - julianday(MIN(check_in))) * 24 - SUM(total),
+               MIN(check_in),
+               MAX(check_out)
+        FROM timeclock
+        WHERE check_out IS NOT NULL AND work_date IS NOT NULL
+        GROUP BY employee_id, work_date
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("dailyworkingtime")
@@ -0,0 +1,148 @@
+"""integer primary keys
+
+Revision ID: e4a9d5c07b18
+Revises: 8d3f2a61c7e4
+Create Date: 2026-10-18 19:41:05.720913
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "e4a9d5c07b18"
+down_revision = "8d3f2a61c7e4"
+branch_labels = None
+depends_on = None
+
+TABLES = ("employee", "rcauthentication", "timeclock", "dailyworkingtime")
+INDEXES = (
+    ("idx_requested_at_desc", "rcauthentication", ["requested_at"]),
+    ("idx_authenticated_at_desc", "rcauthentication", ["authenticated_at"]),
+    ("idx_time_clock_check_in_desc", "timeclock", ["check_in"]),
+    ("idx_time_clock_check_out_desc", "timeclock", ["check_out"]),
+    ("idx_employee_uid", "employee", ["uid"]),
+    ("idx_time_clock_employee_work_date", "timeclock", ["employee_id", "work_date", "check_out"]),
+    ("idx_time_clock_employee_check_in", "timeclock", ["employee_id", "check_in"]),
+)
+
+
+def create_tables(integer_keys):
+    if integer_keys:
+        key_type = sa.Integer
+
+        def key_columns():
+            return [
+                sa.Column("id", sa.Integer, primary_key=True),
+                sa.Column("uuid", sa.String, nullable=False, unique=True),
+            ]
+
+    else:
+        key_type = sa.String
+
+        def key_columns():
+            return [sa.Column("id", sa.String, primary_key=True)]
+
+    op.create_table(
+        "employee",
+        *key_columns(),
+        sa.Column("uid", sa.String),
+        sa.Column("name", sa.String),
+        sa.Column("active", sa.Boolean, nullable=True),
+        sa.Column("checked_in", sa.Boolean),
+        sa.UniqueConstraint("uid", "name", name="unique_uid_name_1"),
+    )
+    op.create_table(
+        "rcauthentication",
+        *key_columns(),
+        sa.Column("uid", sa.String),
+        sa.Column("requested_at", sa.DateTime),
+        sa.Column("authenticated_at", sa.DateTime, nullable=True),
+        sa.Column("success", sa.Boolean),
+        sa.Column("deleted", sa.Boolean),
+    )
+    op.create_table(
+        "timeclock",
+        *key_columns(),
+        sa.Column("check_in", sa.DateTime),
+        sa.Column("check_out", sa.DateTime, nullable=True),
+        sa.Column("total", sa.Float, nullable=True),
+        sa.Column("employee_id", key_type, sa.ForeignKey("employee.id")),
+        sa.Column("work_date", sa.Date, nullable=True),
+    )
+    op.create_table(
+        "dailyworkingtime",
+        sa.Column("employee_id", key_type, sa.ForeignKey("employee.id"), primary_key=True),
+        sa.Column("work_date", sa.Date, primary_key=True),
+        sa.Column("worked", sa.Float),
+        sa.Column("break_count", sa.Integer),
+        sa.Column("break_total", sa.Float),
+        sa.Column("first_check_in", sa.DateTime),
+        sa.Column("last_check_out", sa.DateTime),
+    )
+
+
+def rewrite(integer_keys):
+    bind = op.get_bind()
+    auth_columns = {column["name"] for column in sa.inspect(bind).get_columns("rcauthentication")}
+    deleted = "deleted" if "deleted" in auth_columns else "0"
+
+    for table in TABLES:
+        op.rename_table(table, f"{table}_old")
+    create_tables(integer_keys)
+
+    if integer_keys:
+        # the former string ids become the external uuids
+        op.execute(
+            "INSERT INTO employee (uuid, uid, name, active, checked_in) "
+            "SELECT id, uid, name, active, checked_in FROM employee_old ORDER BY rowid"
+        )
+        op.execute(
+            "INSERT INTO rcauthentication "
+            "(uuid, uid, requested_at, authenticated_at, success, deleted) "
+            f"SELECT id, uid, requested_at, authenticated_at, success, {deleted} "
+            "FROM rcauthentication_old ORDER BY requested_at"
+        )
+        op.execute(
+            "INSERT INTO timeclock (uuid, check_in, check_out, total, employee_id, work_date) "
+            "SELECT t.id, t.check_in, t.check_out, t.total, e.id, t.work_date "
+            "FROM timeclock_old t LEFT JOIN employee e ON e.uuid = t.employee_id "
+            "ORDER BY t.check_in"
+        )
+        employee_join = "JOIN employee e ON e.uuid = d.employee_id"
+    else:
+        op.execute(
+            "INSERT INTO employee (id, uid, name, active, checked_in) "
+            "SELECT uuid, uid, name, active, checked_in FROM employee_old"
+        )
+        op.execute(
+            "INSERT INTO rcauthentication "
+            "(id, uid, requested_at, authenticated_at, success, deleted) "
+            "SELECT uuid, uid, requested_at, authenticated_at, success, deleted "
+            "FROM rcauthentication_old"
+        )
+        op.execute(
+            "INSERT INTO timeclock (id, check_in, check_out, total, employee_id, work_date) "
+            "SELECT t.uuid, t.check_in, t.check_out, t.total, e.uuid, t.work_date "
+            "FROM timeclock_old t LEFT JOIN employee_old e ON e.id = t.employee_id"
+        )
+        employee_join = "JOIN employee_old e ON e.id = d.employee_id"
+    op.execute(
+        "INSERT INTO dailyworkingtime (employee_id, work_date, worked, break_count, "
+        "break_total, first_check_in, last_check_out) "
+        f"SELECT e.{'id' if integer_keys else 'uuid'}, d.work_date, d.worked, d.break_count, "
+        "d.break_total, d.first_check_in, d.last_check_out "
+        f"FROM dailyworkingtime_old d {employee_join}"
+    )
+
+    for table in reversed(TABLES):
+        op.drop_table(f"{table}_old")
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def upgrade():
+    rewrite(integer_keys=True)
+
+
+def downgrade():
+    rewrite(integer_keys=False)
@@ -7,6 +7,15 @@ CurlPostRequest::CurlPostRequest()
 CurlPostRequest::CurlPostRequest(const string new_base_url)
 {
     base_url = new_base_url;
+
+    if (easyhandle != nullptr)
+    {
+        curl_easy_setopt(easyhandle, CURLOPT_CONNECTTIMEOUT, 1L);
+        curl_easy_setopt(easyhandle, CURLOPT_TIMEOUT, 2L);
+        curl_easy_setopt(easyhandle, CURLOPT_TCP_KEEPALIVE, 1L);
+        curl_easy_setopt(easyhandle, CURLOPT_NOSIGNAL, 1L);
+        curl_easy_setopt(easyhandle, CURLOPT_WRITEFUNCTION, write_function);
+    }
 }
 
 CurlPostRequest::~CurlPostRequest()
@@ -15,23 +24,19 @@ CurlPostRequest::~CurlPostRequest()
     easyhandle = nullptr;
 }
 
-void
-CurlPostRequest::perform_post(const string path)
+long
+CurlPostRequest::perform_post(const string path, const string post_fields)
 {
     const string tornado_url = base_url + path; //"http://localhost:8888/add/" + card_uid;
-    //        const string json_data = "{\"user_id\": " + card_uid + ",\"username\": \"Some Name\"}";
-
-    //        cout << "Sending Post request..." << endl;
-    //        CURL *easyhandle = curl_easy_init();
-    //        CURLcode response;
+    long status_code = 0;
 
     if (easyhandle != nullptr)
     {
-        curl_easy_setopt(easyhandle, CURLOPT_TIMEOUT, 1);
         curl_easy_setopt(easyhandle, CURLOPT_URL, tornado_url.c_str());
-        curl_easy_setopt(easyhandle, CURLOPT_POST, 1);
-        curl_easy_setopt(easyhandle, CURLOPT_READFUNCTION, read_function);
-        curl_easy_setopt(easyhandle, CURLOPT_READDATA, nullptr);
+        curl_easy_setopt(easyhandle, CURLOPT_POST, 1L);
+        // COPYPOSTFIELDS because post_fields is gone once we return
+        curl_easy_setopt(easyhandle, CURLOPT_POSTFIELDSIZE, static_cast<long>(post_fields.size()));
+        curl_easy_setopt(easyhandle, CURLOPT_COPYPOSTFIELDS, post_fields.c_str());
 
         response = curl_easy_perform(easyhandle);
 
@@ -40,15 +45,16 @@ CurlPostRequest::perform_post(const string path)
             cout << "curl_easy_perform(easyhandle) failed: " << curl_easy_strerror(response) << endl;
         } else
         {
-            cout << "Reached next point" << endl;
+            curl_easy_getinfo(easyhandle, CURLINFO_RESPONSE_CODE, &status_code);
+            cout << "Reached next point (" << status_code << ")" << endl;
         }
     }
+    return status_code;
 }
 
 size_t
-CurlPostRequest::read_function(char *bufptr, size_t size, size_t nmemb, void *ourpointer)
+CurlPostRequest::write_function(char *ptr, size_t size, size_t nmemb, void *userdata)
 {
-    return 1;
+    // the response body is not needed
+    return size * nmemb;
 }
-
-
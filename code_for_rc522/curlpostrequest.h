@@ -14,19 +14,24 @@ class CurlPostRequest
 {
 
 private:
+    // the handle is reused for all requests so the connection is kept alive
     CURL *easyhandle = curl_easy_init();
     CURLcode response;
 
     string base_url;
 
-    static size_t read_function(char *bufptr, size_t size, size_t nmemb, void *ourpointer);
+    static size_t write_function(char *ptr, size_t size, size_t nmemb, void *userdata);
 
 public:
     CurlPostRequest();
     CurlPostRequest(const string new_base_url);
     ~CurlPostRequest();
 
-    void perform_post(const string path);
+    CurlPostRequest(const CurlPostRequest &) = delete;
+    CurlPostRequest &operator=(const CurlPostRequest &) = delete;
+
+    // returns the HTTP status code, 0 if the server could not be reached
+    long perform_post(const string path, const string post_fields = "");
 };
 
 #endif // CURLPOSTREQUEST_H
@@ -3,33 +3,34 @@
 #include <iostream>
 #include <iomanip>
 #include <string>
-#include <thread>
 #include <unistd.h>
 #include <vector>
 #include <wiringPi.h>
-#include "curlpostrequest.h"
 #include "mfrc522_delegate.h"
+#include "tapsender.h"
 
 using namespace std;
 
 #define LedPin 0
 
-void
-curl_thread_request(string additional_parameter)
-{
-    CurlPostRequest curlPostRequest = CurlPostRequest("http://localhost:8888");
-    curlPostRequest.perform_post("/add/" + additional_parameter);
-}
-
 
 int main(int argc, char *argv[])
 {
 
     bool read_only = false;
+    string spool_path = "timeclock_spool.log";
 
-    if (argc > 1)
+    for (int i = 1; i < argc; ++i)
     {
-        read_only = static_cast<bool>(static_cast<string>(argv[1]) == "--read=only");
+        const string argument = argv[i];
+        if (argument == "--read=only")
+        {
+            read_only = true;
+        }
+        else if (argument.rfind("--spool=", 0) == 0)
+        {
+            spool_path = argument.substr(8);
+        }
     }
 
     if (read_only)
@@ -47,6 +48,12 @@ int main(int argc, char *argv[])
         return 1;
     }
 
+    TapSender tap_sender("http://localhost:8888", spool_path);
+    if (!read_only)
+    {
+        tap_sender.start();
+    }
+
     pinMode(LedPin, OUTPUT);
     digitalWrite(LedPin, HIGH);
 
@@ -85,17 +92,16 @@ int main(int argc, char *argv[])
         {
             mfrc522_delegate.uid_bytes_to_string(mfrc);
 
-            thread th1(curl_thread_request, mfrc522_delegate.get_card_uid());
-
             digitalWrite(LedPin, LOW);
 
-            mfrc522_delegate.halt_picc();
-
-            if (th1.joinable())
+            // never blocks on the network, the tap is sent or spooled in the background
+            if (!read_only)
             {
-                th1.join();
+                tap_sender.enqueue(mfrc522_delegate.get_card_uid());
             }
 
+            mfrc522_delegate.halt_picc();
+
             digitalWrite(LedPin, HIGH);
         }
         catch (exception &err)
@@ -105,6 +111,7 @@ int main(int argc, char *argv[])
         }
     }
 
+    tap_sender.stop();
     curl_global_cleanup();
     return 0;
 }
@@ -16,10 +16,12 @@ SOURCES += \
         main.cpp \
     MFRC522.cpp \
     mfrc522_delegate.cpp \
-    curlpostrequest.cpp
+    curlpostrequest.cpp \
+    tapsender.cpp
 
 HEADERS += \
     # bcm2835.h \
     MFRC522.h \
     mfrc522_delegate.h \
-    curlpostrequest.h
+    curlpostrequest.h \
+    tapsender.h
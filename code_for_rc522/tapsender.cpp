@@ -0,0 +1,224 @@
+#include "tapsender.h"
+
+#include <cstdio>
+#include <fstream>
+#include <iomanip>
+#include <sstream>
+#include <unistd.h>
+
+TapSender::TapSender(const string base_url, const string spool_path, size_t max_queued,
+                     std::chrono::seconds retry_interval)
+    : request(base_url), spool_path(spool_path), max_queued(max_queued),
+      retry_interval(retry_interval)
+{
+    char hostname[64] = "reader";
+    gethostname(hostname, sizeof(hostname) - 1);
+    reader_id = hostname;
+
+    std::ifstream spool(spool_path);
+    spool_pending = spool.good() && spool.peek() != std::ifstream::traits_type::eof();
+    next_retry = std::chrono::steady_clock::now();
+}
+
+TapSender::~TapSender()
+{
+    stop();
+}
+
+void
+TapSender::start()
+{
+    std::lock_guard<std::mutex> lock(queue_mutex);
+    if (!running)
+    {
+        running = true;
+        worker = std::thread(&TapSender::run, this);
+    }
+}
+
+void
+TapSender::stop()
+{
+    {
+        std::lock_guard<std::mutex> lock(queue_mutex);
+        running = false;
+    }
+    queue_changed.notify_all();
+
+    if (worker.joinable())
+    {
+        worker.join();
+    }
+}
+
+void
+TapSender::enqueue(const string uid)
+{
+    using namespace std::chrono;
+
+    const auto now = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
+
+    std::ostringstream timestamp;
+    timestamp << now / 1000 << "." << std::setw(3) << std::setfill('0') << now % 1000;
+
+    std::unique_lock<std::mutex> lock(queue_mutex);
+    // the worker spools instead of waiting for the network, so this only
+    // blocks if the disk is stuck as well
+    queue_changed.wait(lock, [this] { return queue.size() < max_queued || !running; });
+
+    queue.push_back(Tap{uid, timestamp.str(), reader_id + "-" + std::to_string(now) + "-"
+                                                  + std::to_string(counter++)});
+    lock.unlock();
+    queue_changed.notify_all();
+}
+
+void
+TapSender::run()
+{
+    while (true)
+    {
+        std::vector<Tap> taps;
+        {
+            std::unique_lock<std::mutex> lock(queue_mutex);
+            auto ready = [this] { return !queue.empty() || !running; };
+            if (spool_pending)
+            {
+                queue_changed.wait_until(lock, next_retry, ready);
+            }
+            else
+            {
+                queue_changed.wait(lock, ready);
+            }
+
+            if (queue.empty() && !running)
+            {
+                return;
+            }
+            taps.assign(queue.begin(), queue.end());
+            queue.clear();
+        }
+        queue_changed.notify_all();
+
+        // keep the order: nothing may overtake taps which are already spooled
+        size_t sent = 0;
+        if (!spool_pending)
+        {
+            while (sent < taps.size() && send(taps[sent]))
+            {
+                ++sent;
+            }
+        }
+        if (sent < taps.size())
+        {
+            append_to_spool(std::vector<Tap>(taps.begin() + sent, taps.end()));
+            if (!spool_pending)
+            {
+                spool_pending = true;
+                next_retry = std::chrono::steady_clock::now() + retry_interval;
+            }
+        }
+
+        if (spool_pending && std::chrono::steady_clock::now() >= next_retry)
+        {
+            drain_spool();
+        }
+    }
+}
+
+bool
+TapSender::send(const Tap &tap)
+{
+    const long status_code = request.perform_post(
+        "/add/" + tap.uid, "timestamp=" + tap.timestamp + "&idempotency_key=" + tap.idempotency_key
+    );
+
+    if (status_code >= 400 && status_code < 500)
+    {
+        // retrying won't help, e.g. the timestamp was rejected
+        cout << "Tap of " << tap.uid << " rejected (" << status_code << ")" << endl;
+        return true;
+    }
+    return status_code != 0 && status_code < 500;
+}
+
+void
+TapSender::append_to_spool(const std::vector<Tap> &taps)
+{
+    std::ofstream spool(spool_path, std::ios::app);
+    for (const Tap &tap : taps)
+    {
+        spool << encode(tap) << "\n";
+    }
+    spool.flush();
+    cout << "Spooled " << taps.size() << " tap(s) to " << spool_path << endl;
+}
+
+void
+TapSender::drain_spool()
+{
+    std::vector<string> lines;
+    {
+        std::ifstream spool(spool_path);
+        string line;
+        while (std::getline(spool, line))
+        {
+            if (!line.empty())
+            {
+                lines.push_back(line);
+            }
+        }
+    }
+
+    size_t sent = 0;
+    for (; sent < lines.size(); ++sent)
+    {
+        Tap tap;
+        if (decode(lines[sent], tap) && !send(tap))
+        {
+            break;
+        }
+    }
+
+    if (sent == lines.size())
+    {
+        std::remove(spool_path.c_str());
+        spool_pending = false;
+        cout << "Replayed " << sent << " spooled tap(s)" << endl;
+        return;
+    }
+
+    // rewrite the remaining taps atomically, the spool must never lose a tap
+    const string tmp_path = spool_path + ".tmp";
+    {
+        std::ofstream tmp(tmp_path, std::ios::trunc);
+        for (size_t i = sent; i < lines.size(); ++i)
+        {
+            tmp << lines[i] << "\n";
+        }
+    }
+    std::rename(tmp_path.c_str(), spool_path.c_str());
+    next_retry = std::chrono::steady_clock::now() + retry_interval;
+}
+
+string
+TapSender::encode(const Tap &tap)
+{
+    // the card uid contains spaces, so the uid is the last field
+    return tap.timestamp + "\t" + tap.idempotency_key + "\t" + tap.uid;
+}
+
+bool
+TapSender::decode(const string &line, Tap &tap)
+{
+    const size_t first = line.find('\t');
+    const size_t second = line.find('\t', first + 1);
+    if (first == string::npos || second == string::npos)
+    {
+        return false;
+    }
+
+    tap.timestamp = line.substr(0, first);
+    tap.idempotency_key = line.substr(first + 1, second - first - 1);
+    tap.uid = line.substr(second + 1);
+    return true;
+}
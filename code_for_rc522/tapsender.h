@@ -0,0 +1,68 @@
+#ifndef TAPSENDER_H
+#define TAPSENDER_H
+
+#include <chrono>
+#include <condition_variable>
+#include <deque>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+#include "curlpostrequest.h"
+
+using std::string;
+
+struct Tap
+{
+    string uid;
+    string timestamp;   // UTC seconds since the epoch, taken when the card was read
+    string idempotency_key;
+};
+
+/*
+ * Delivers card taps to the server from one long-lived worker thread.
+ *
+ * Taps are queued without blocking the reader loop. While the server
+ * can't be reached they are appended to a spool file and replayed in
+ * order, with their original timestamps, once it is back.
+ */
+class TapSender
+{
+
+private:
+    CurlPostRequest request;
+    string spool_path;
+    size_t max_queued;
+    std::chrono::seconds retry_interval;
+
+    std::deque<Tap> queue;
+    std::mutex queue_mutex;
+    std::condition_variable queue_changed;
+    std::thread worker;
+    bool running = false;
+
+    bool spool_pending = false;
+    std::chrono::steady_clock::time_point next_retry;
+
+    string reader_id;
+    unsigned long counter = 0;
+
+    void run();
+    bool send(const Tap &tap);
+    void append_to_spool(const std::vector<Tap> &taps);
+    void drain_spool();
+
+    static string encode(const Tap &tap);
+    static bool decode(const string &line, Tap &tap);
+
+public:
+    TapSender(const string base_url, const string spool_path, size_t max_queued = 256,
+              std::chrono::seconds retry_interval = std::chrono::seconds(5));
+    ~TapSender();
+
+    void start();
+    void stop();
+    void enqueue(const string uid);
+};
+
+#endif // TAPSENDER_H
@@ -4,7 +4,7 @@ from setuptools import find_packages, setup
 
 requires = [
     "tornado",
-    "tornado-sqlalchemy",
+    "SQLAlchemy",
     #'psycopg2',
 ]
 
@@ -24,7 +24,7 @@ setup(
     ],
     entry_points={
         "console_scripts": [
-            "serve_app = src:runserver",
+            "serve_app = src.runserver:run",
         ],
     },
 )
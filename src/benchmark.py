@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test of the HTTP endpoints against a seeded SQLite database.
+
+The application and the client run in the same process, results are
+written as JSON so runs can be compared with each other:
+
+    python -m src.benchmark --employees 100 --years 2 --concurrency 20
+
+With `--workers N` the HTTP scenarios run against `runserver.py
+--workers N` in a separate process group instead, driven by `--clients`
+client processes, to measure the scaling across cores:
+
+    python -m src.benchmark --workers 4 --clients 4 --scenarios list info
+
+With `--primary-keys` the storage of the employee and timeclock tables
+with integer primary keys is compared with the former string ones, one
+entry per employee and day:
+
+    python -m src.benchmark --primary-keys --employees 200 --days 1000
+"""
+
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Index, MetaData, String, Table, insert, select, text
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.options import options
+
+from src.database import make_engine, make_session_factory
+from src.export import export_payroll
+from src.ingest import Tap, chunks, ingest_taps
+from src.maintenance import compact
+from src.models import Base, Employee, RCAuthentication, TimeClock, uuid_str
+from src.runserver import Application
+from src.sites import DEFAULT_SITE, Site
+from src.views import database_stuff
+
+SCENARIOS = (
+    "add",
+    "info",
+    "list",
+    "list_employees",
+    "auth",
+    "validate_auth",
+    "database_stuff",
+    "database_stuff_grouped",
+    "export",
+)
+
+# the scenarios which only use HTTP, the others need the application in-process
+HTTP_SCENARIOS = ("add", "info", "list", "list_employees", "auth")
+
+AUTH_WAIT_URL = re.compile(r"/wait/auth/([0-9a-f-]+)")
+
+
+def history_taps(uids: List[str], day: datetime.date, rng: random.Random) -> List[Tap]:
+    """Two shifts with a lunch break for every employee."""
+    start = datetime.datetime.combine(day, datetime.time(7))
+    taps = []
+    for uid in uids:
+        check_in = start + datetime.timedelta(minutes=rng.randint(0, 120))
+        lunch = check_in + datetime.timedelta(hours=4, minutes=rng.randint(0, 30))
+        back = lunch + datetime.timedelta(minutes=rng.randint(30, 60))
+        leave = back + datetime.timedelta(hours=4, minutes=rng.randint(0, 60))
+        taps.extend(Tap(uid, tapped_at, uuid_str()) for tapped_at in (check_in, lunch, back, leave))
+    return taps
+
+
+async def seed(session_factory, employees: int, years: float, seed_value: int = 0) -> List[str]:
+    """
+    Create `employees` employees with `years` of working days and web logins.
+
+    Returns the uids, the history ends yesterday so nobody is checked in.
+    """
+    rng = random.Random(seed_value)
+    uids = [f"bench{number:05d}" for number in range(employees)]
+    async with session_factory() as session:
+        await session.execute(
+            insert(Employee),
+            [
+                dict(uuid=uuid_str(), uid=uid, name=uid, active=True, checked_in=False)
+                for uid in uids
+            ],
+        )
+        await session.commit()
+
+        today = datetime.date.today()
+        day = today - datetime.timedelta(days=int(years * 365))
+        auths = []
+        while day < today:
+            if day.weekday() < 5:
+                await ingest_taps(session, history_taps(uids, day, rng))
+                requested_at = datetime.datetime.combine(day, datetime.time(12))
+                for uid in rng.sample(uids, max(1, employees // 10)):
+                    success = rng.random() < 0.8
+                    auths.append(
+                        dict(
+                            uuid=uuid_str(),
+                            uid=uid,
+                            requested_at=requested_at,
+                            authenticated_at=(
+                                requested_at + datetime.timedelta(seconds=5) if success else None
+                            ),
+                            success=success,
+                            deleted=not success,
+                        )
+                    )
+            day += datetime.timedelta(days=1)
+        for start in range(0, len(auths), 10000):
+            await session.execute(insert(RCAuthentication), auths[start : start + 10000])
+        await session.commit()
+    return uids
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of the sorted `latencies`."""
+    if not latencies:
+        return 0.0
+    return latencies[max(0, math.ceil(fraction * len(latencies)) - 1)]
+
+
+class Scenarios:
+    """
+    One request (or request flow for `auth`) per call, against `base_url`.
+
+    `database_stuff` calls the tap handling directly, without HTTP and
+    group commit, to show the Python overhead per tap.
+    `database_stuff_grouped` does the same through the group commit
+    writer, with `--concurrency` taps sharing a transaction.
+    `export` writes the payroll CSV of all employees over the whole
+    seeded history, `--employees 500 --years 5` are about 2.5M punches.
+    """
+
+    def __init__(
+        self,
+        client: AsyncHTTPClient,
+        base_url: str,
+        uids: List[str],
+        seed_value: int,
+        site: Site,
+        history_from: datetime.date,
+    ):
+        self.client = client
+        self.base_url = base_url
+        self.site = site
+        self.history_from = history_from
+        self.uids = uids
+        self.rng = random.Random(seed_value)
+        # a tap confirms the latest login of its card, so concurrent flows need distinct cards
+        self.idle_uids = list(uids)
+
+    def fetch(self, path: str, **kwargs):
+        return self.client.fetch(self.base_url + path, follow_redirects=False, **kwargs)
+
+    async def add(self):
+        await self.fetch(f"/add/{self.rng.choice(self.uids)}", method="POST", body="")
+
+    async def info(self):
+        await self.fetch(f"/info/{self.rng.choice(self.uids)}")
+
+    async def list(self):
+        await self.fetch(f"/list/{self.rng.choice(self.uids)}")
+
+    async def list_employees(self):
+        await self.fetch("/list/employees")
+
+    async def auth(self):
+        """Request a web login, tap the card and wait for the redirect."""
+        uid = self.idle_uids.pop(self.rng.randrange(len(self.idle_uids)))
+        try:
+            response = await self.fetch(f"/auth/request/{uid}", method="POST", body="")
+            auth_id = AUTH_WAIT_URL.search(response.body.decode()).group(1)
+            waiting = asyncio.ensure_future(self.fetch(f"/wait/auth/{auth_id}", raise_error=False))
+            await self.fetch(f"/add/{uid}", method="POST", body="")
+            response = await waiting
+            if response.code != 302:
+                raise HTTPClientError(response.code, response=response)
+        finally:
+            self.idle_uids.append(uid)
+
+    async def validate_auth(self):
+        """One poll of the progress bar of a pending login, as without long-poll."""
+        auth = self.site.settings["auth_registry"].create(self.rng.choice(self.uids))
+        await self.fetch(f"/validate/auth/{auth.auth_id}/{self.rng.randrange(60)}")
+
+    async def export(self):
+        async with self.site.sqla() as session:
+            await export_payroll(session, io.StringIO(), self.history_from, datetime.date.today())
+
+    async def database_stuff(self, writer=None):
+        async with self.site.sqla() as session:
+            await database_stuff(
+                self.rng.choice(self.uids),
+                session,
+                self.site.settings["auth_hub"],
+                self.site.settings["employee_cache"],
+                writer,
+                registry=self.site.settings["auth_registry"],
+            )
+
+    async def database_stuff_grouped(self):
+        await self.database_stuff(self.site.settings["writer"])
+
+
+async def collect(
+    call: Callable, requests: int, concurrency: int
+) -> Tuple[List[float], int, float, float]:
+    """The latencies of the successful calls, the errors, the wall and the CPU seconds."""
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                await call()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started, time.process_time() - cpu_started
+
+
+def summarize(
+    requests: int, latencies: List[float], errors: int, elapsed: float, cpu: Optional[float]
+) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    summary = dict(
+        requests=requests,
+        errors=errors,
+        seconds=round(elapsed, 3),
+        throughput=round(len(latencies) / elapsed, 1),
+    )
+    if cpu is not None:
+        # client and server share the process
+        summary["cpu_ms_per_request"] = round(cpu / requests * 1000, 3)
+    summary.update(
+        p50_ms=round(percentile(latencies, 0.50) * 1000, 2),
+        p95_ms=round(percentile(latencies, 0.95) * 1000, 2),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 2),
+    )
+    return summary
+
+
+async def measure(call: Callable, requests: int, concurrency: int) -> Dict[str, float]:
+    return summarize(requests, *await collect(call, requests, concurrency))
+
+
+async def run_benchmark(args) -> Dict:
+    engine = make_engine(f"sqlite+aiosqlite:///{args.database}", pool_size=args.pool_size)
+    session_factory = make_session_factory(engine)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    started = time.perf_counter()
+    uids = await seed(session_factory, args.employees, args.years, args.seed)
+    seeded = time.perf_counter() - started
+
+    options.production = args.production
+    application = Application(engine=engine)
+    site = application.sites.get(DEFAULT_SITE)
+    await site.load()
+    sockets = bind_sockets(0, "127.0.0.1")
+    port = sockets[0].getsockname()[1]
+    server = HTTPServer(application)
+    server.add_sockets(sockets)
+
+    client = AsyncHTTPClient(max_clients=args.concurrency * 2)
+    history_from = datetime.date.today() - datetime.timedelta(days=int(args.years * 365))
+    scenarios = Scenarios(client, f"http://127.0.0.1:{port}", uids, args.seed, site, history_from)
+    results = {}
+    try:
+        for name in args.scenarios:
+            call = getattr(scenarios, name)
+            # warm up connections and caches before measuring
+            await measure(call, min(args.requests, args.concurrency), args.concurrency)
+            results[name] = await measure(call, args.requests, args.concurrency)
+    finally:
+        server.stop()
+        client.close()
+        await engine.dispose()
+
+    return benchmark_report(args, seeded, results)
+
+
+def benchmark_report(args, seeded: float, results: Dict) -> Dict:
+    return dict(
+        started_at=datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        config=dict(
+            employees=args.employees,
+            years=args.years,
+            concurrency=args.concurrency,
+            requests=args.requests,
+            pool_size=args.pool_size,
+            seed=args.seed,
+            production=args.production,
+            workers=args.workers,
+            clients=args.clients if args.workers else None,
+            cpus=os.cpu_count(),
+        ),
+        seed_seconds=round(seeded, 3),
+        scenarios=results,
+    )
+
+
+def start_server(args, port: int) -> subprocess.Popen:
+    """`runserver.py --workers` on the seeded database, in its own process group."""
+    command = [
+        sys.executable,
+        "-m",
+        "src.runserver",
+        f"--port={port}",
+        f"--workers={args.workers}",
+        f"--db_pool_size={args.pool_size}",
+        f"--production={args.production}",
+        "--maintenance_interval=0",
+        # without the access log
+        "--logging=warning",
+    ]
+    env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{args.database}")
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, start_new_session=True)
+
+
+async def wait_until_listening(base_url: str, timeout: float = 30.0):
+    client = AsyncHTTPClient()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.fetch(f"{base_url}/list/employees")
+            return
+        except (OSError, HTTPClientError):
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def client_process(
+    base_url: str, uids: List[str], seed_value: int, name: str, requests: int, concurrency: int
+):
+    """One client process of `--workers` mode, returns the results of `collect`."""
+
+    async def run():
+        client = AsyncHTTPClient(max_clients=concurrency * 2)
+        scenarios = Scenarios(client, base_url, uids, seed_value, None, None)
+        call = getattr(scenarios, name)
+        await collect(call, min(requests, concurrency), concurrency)
+        return await collect(call, requests, concurrency)
+
+    return asyncio.run(run())
+
+
+def key_layout(integer_keys: bool) -> Tuple[Table, Table]:
+    """
+    The employee and timeclock tables, with string primary keys as before
+    the integer keys, both with the indexes of the models.
+    """
+    if integer_keys:
+        return Employee.__table__, TimeClock.__table__
+    metadata = MetaData()
+    tables = []
+    for model in (Employee, TimeClock):
+        columns = []
+        for column in model.__table__.columns:
+            if column.name == "uuid":
+                continue
+            if column.primary_key or column.name == "employee_id":
+                column = Column(column.name, String, primary_key=column.primary_key)
+            else:
+                column = Column(column.name, column.type, nullable=column.nullable)
+            columns.append(column)
+        table = Table(model.__tablename__, metadata, *columns)
+        for index in model.__table__.indexes:
+            Index(index.name, *[table.c[column.name] for column in index.columns])
+        tables.append(table)
+    return tables[0], tables[1]
+
+
+async def primary_keys_benchmark(
+    database: str, integer_keys: bool, employees: int, days: int, requests: int, seed_value: int
+) -> Dict[str, float]:
+    """Sizes and join latencies of one key layout, entries inserted in chronological order."""
+    rng = random.Random(seed_value)
+    employee, time_clock = key_layout(integer_keys)
+    engine = make_engine(f"sqlite+aiosqlite:///{database}")
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(employee.metadata.create_all, [employee, time_clock])
+            uids = [f"bench{number:05d}" for number in range(employees)]
+            await connection.execute(
+                insert(employee),
+                [
+                    dict({"uuid" if integer_keys else "id": uuid_str()}, uid=uid, name=uid)
+                    for uid in uids
+                ],
+            )
+            ids = [row.id for row in await connection.execute(select(employee.c.id))]
+            start = datetime.datetime.combine(
+                datetime.date.today() - datetime.timedelta(days=days), datetime.time(7)
+            )
+            entries = []
+            for day in range(days):
+                for employee_id in ids:
+                    check_in = start + datetime.timedelta(days=day, minutes=rng.randint(0, 120))
+                    total = rng.uniform(6, 9)
+                    entries.append(
+                        dict(
+                            {"uuid" if integer_keys else "id": uuid_str()},
+                            check_in=check_in,
+                            check_out=check_in + datetime.timedelta(hours=total),
+                            total=total,
+                            employee_id=employee_id,
+                            work_date=check_in.date(),
+                        )
+                    )
+            for chunk in chunks(entries, 10000):
+                await connection.execute(insert(time_clock), chunk)
+        await compact(engine)
+
+        async with engine.connect() as connection:
+            try:
+                indexes = (
+                    await connection.execute(
+                        text(
+                            "SELECT sum(pgsize) FROM dbstat WHERE name IN "
+                            "(SELECT name FROM sqlite_master WHERE type = 'index')"
+                        )
+                    )
+                ).scalar()
+            except Exception:
+                # SQLite built without the dbstat virtual table
+                indexes = None
+            join = select(time_clock.c.check_in, time_clock.c.total, employee.c.uid).join(
+                employee, employee.c.id == time_clock.c.employee_id
+            )
+            per_employee = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                result = await connection.execute(join.where(employee.c.uid == rng.choice(uids)))
+                result.fetchall()
+                per_employee.append(time.perf_counter() - started)
+            all_employees = []
+            for _ in range(5):
+                started = time.perf_counter()
+                (await connection.execute(join)).fetchall()
+                all_employees.append(time.perf_counter() - started)
+    finally:
+        await engine.dispose()
+
+    per_employee.sort()
+    return dict(
+        file_mb=round(os.path.getsize(database) / 1e6, 1),
+        indexes_mb=round(indexes / 1e6, 1) if indexes is not None else None,
+        per_employee_join_p50_ms=round(percentile(per_employee, 0.50) * 1000, 2),
+        per_employee_join_p95_ms=round(percentile(per_employee, 0.95) * 1000, 2),
+        all_employees_join_min_ms=round(min(all_employees) * 1000, 1),
+        all_employees_join_max_ms=round(max(all_employees) * 1000, 1),
+    )
+
+
+def run_primary_keys_benchmark(args) -> Dict:
+    results = {}
+    for name, integer_keys in (("string", False), ("integer", True)):
+        results[name] = asyncio.run(
+            primary_keys_benchmark(
+                f"{args.database}.{name}",
+                integer_keys,
+                args.employees,
+                args.days,
+                args.requests,
+                args.seed,
+            )
+        )
+    return dict(
+        started_at=datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        config=dict(
+            employees=args.employees, days=args.days, requests=args.requests, seed=args.seed
+        ),
+        primary_keys=results,
+    )
+
+
+def run_workers_benchmark(args) -> Dict:
+    async def prepare():
+        engine = make_engine(f"sqlite+aiosqlite:///{args.database}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        started = time.perf_counter()
+        uids = await seed(make_session_factory(engine), args.employees, args.years, args.seed)
+        await engine.dispose()
+        return uids, time.perf_counter() - started
+
+    uids, seeded = asyncio.run(prepare())
+    sockets = bind_sockets(0, "127.0.0.1")
+    port = sockets[0].getsockname()[1]
+    for sock in sockets:
+        sock.close()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(args, port)
+    results = {}
+    try:
+        asyncio.run(wait_until_listening(base_url))
+        # spawned, not forked, so the clients don't inherit the state of this process
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            for name in args.scenarios:
+                runs = pool.starmap(
+                    client_process,
+                    [
+                        (
+                            base_url,
+                            # a card is only used by one client process, see Scenarios.auth
+                            uids[number :: args.clients],
+                            args.seed + number,
+                            name,
+                            args.requests // args.clients,
+                            max(1, args.concurrency // args.clients),
+                        )
+                        for number in range(args.clients)
+                    ],
+                )
+                results[name] = summarize(
+                    args.requests // args.clients * args.clients,
+                    [latency for latencies, _, _, _ in runs for latency in latencies],
+                    sum(errors for _, errors, _, _ in runs),
+                    max(elapsed for _, _, elapsed, _ in runs),
+                    None,
+                )
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+    return benchmark_report(args, seeded, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--employees", type=int, default=50)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--production", action="store_true", help="compiled templates, without debug mode"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="serve from `runserver.py --workers N` in separate processes, HTTP scenarios only",
+    )
+    parser.add_argument("--clients", type=int, default=4, help="client processes with --workers")
+    parser.add_argument(
+        "--primary-keys",
+        action="store_true",
+        help="compare the storage of integer and string primary keys instead",
+    )
+    parser.add_argument(
+        "--days", type=int, default=1000, help="days of entries per employee with --primary-keys"
+    )
+    parser.add_argument("--database", help="SQLite file, a temporary one is used by default")
+    parser.add_argument("--output", default="-")
+    args = parser.parse_args()
+
+    if args.workers is not None:
+        if args.workers < 1 or args.clients < 1:
+            parser.error("--workers and --clients must be at least 1")
+        if args.scenarios == list(SCENARIOS):
+            args.scenarios = list(HTTP_SCENARIOS)
+        elif not set(args.scenarios) <= set(HTTP_SCENARIOS):
+            parser.error(f"--workers only runs the scenarios {', '.join(HTTP_SCENARIOS)}")
+    if "auth" in args.scenarios and args.concurrency > args.employees:
+        parser.error("the auth scenario needs at least one employee per concurrent request")
+
+    temporary = None
+    if args.database is None:
+        temporary = tempfile.TemporaryDirectory()
+        args.database = os.path.join(temporary.name, "benchmark.sqlite3")
+    elif os.path.exists(args.database):
+        parser.error(f"{args.database} exists, the benchmark needs an empty database")
+
+    try:
+        if args.primary_keys:
+            report = run_primary_keys_benchmark(args)
+        elif args.workers is None:
+            report = asyncio.run(run_benchmark(args))
+        else:
+            report = run_workers_benchmark(args)
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+
+    fp = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        json.dump(report, fp, indent=2)
+        fp.write("\n")
+    finally:
+        if fp is not sys.stdout:
+            fp.close()
+
+
+if __name__ == "__main__":
+    main()
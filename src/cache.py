@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from src import statements
+from src.shifts import closes
+
+
+@dataclass
+class EmployeeState:
+    id: int
+    uid: str
+    checked_in: bool
+    open_time_clock_uuid: Optional[str] = None
+    open_check_in: Optional[datetime.datetime] = None
+
+    def closed_by(self, tapped_at: datetime.datetime) -> bool:
+        """Whether a tap at `tapped_at` checks out of the open entry."""
+        return self.open_time_clock_uuid is not None and closes(self.open_check_in, tapped_at)
+
+    def out_of_order(self, tapped_at: datetime.datetime) -> bool:
+        """Whether a tap at `tapped_at` is older than the open entry of its day."""
+        return (
+            self.open_time_clock_uuid is not None
+            and self.open_check_in.date() == tapped_at.date()
+            and tapped_at < self.open_check_in
+        )
+
+
+class EmployeeStateCache:
+    """
+    Write-through cache of employees by uid and their currently open TimeClock.
+
+    `database_stuff` updates an entry when it queues the check-in or
+    check-out, before the group commit writer committed it, so the next
+    tap of the same card already sees the new state. The writer commits
+    the events in queue order. Batches of replayed taps are queued in
+    between and don't update entries; those of their employees, entries
+    whose write failed and entries changed by another process are
+    invalidated and loaded lazily again, like unknown entries. The
+    invalidations of other processes are best-effort datagrams, so the
+    writer checks every event against the database: a check-out of an
+    entry which was closed in the meantime, e.g. by a batch queued before
+    it, matches no open row, and a check-in finds the entry another
+    process opened. Both taps are resolved again from the database.
+    """
+
+    def __init__(self):
+        self._employees: Dict[str, EmployeeState] = {}
+
+    async def load(self, session):
+        """Fill the cache with all active employees and today's open entries."""
+        result = await session.execute(statements.active_employees)
+        employees = {
+            row.id: EmployeeState(id=row.id, uid=row.uid, checked_in=bool(row.checked_in))
+            for row in result
+        }
+        result = await session.execute(statements.open_time_clocks, {"work_date": date.today()})
+        for row in result:
+            state = employees.get(row.employee_id)
+            if state is not None:
+                state.open_time_clock_uuid = row.uuid
+                state.open_check_in = row.check_in
+        self._employees = {state.uid: state for state in employees.values()}
+
+    async def get(
+        self, session, user_uid: str, day: Optional[date] = None
+    ) -> Optional[EmployeeState]:
+        """
+        The employee with the open entry of `day`, today by default.
+
+        Only today's state is cached, the state of an earlier day (for
+        replayed taps) is loaded from the database every time.
+        """
+        if day is not None and day != date.today():
+            return await self._load_employee(session, user_uid, day)
+        state = self._employees.get(user_uid)
+        if state is None:
+            state = await self._load_employee(session, user_uid, date.today())
+            if state is not None:
+                self._employees[user_uid] = state
+        return state
+
+    async def _load_employee(self, session, user_uid: str, day: date) -> Optional[EmployeeState]:
+        result = await session.execute(statements.employee_by_uid, {"uid": user_uid})
+        employee = result.first()
+        if employee is None:
+            return None
+
+        result = await session.execute(
+            statements.open_time_clock_of_employee,
+            {"employee_id": employee.id, "work_date": day},
+        )
+        time_clock = result.first()
+        return EmployeeState(
+            id=employee.id,
+            uid=employee.uid,
+            checked_in=bool(employee.checked_in),
+            open_time_clock_uuid=time_clock.uuid if time_clock is not None else None,
+            open_check_in=time_clock.check_in if time_clock is not None else None,
+        )
+
+    def checked_in(self, user_uid: str, time_clock_uuid: str, check_in: datetime.datetime):
+        state = self._employees.get(user_uid)
+        if state is not None:
+            state.checked_in = True
+            state.open_time_clock_uuid = time_clock_uuid
+            state.open_check_in = check_in
+
+    def checked_out(self, user_uid: str):
+        state = self._employees.get(user_uid)
+        if state is not None:
+            state.checked_in = False
+            state.open_time_clock_uuid = None
+            state.open_check_in = None
+
+    def invalidate(self, user_uid: Optional[str] = None):
+        if user_uid is None:
+            self._employees.clear()
+        else:
+            self._employees.pop(user_uid, None)
+
+
+class FragmentCache:
+    """
+    Cache of rendered HTMX partials keyed by fragment name and argument.
+
+    Entries live until they are invalidated by a change of the underlying
+    data, only fragments showing a still running total get a TTL.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], Tuple[bytes, Optional[float]]] = {}
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+
+    def get(self, name: str, key: str = "") -> Optional[bytes]:
+        entry = self._entries.get((name, key))
+        if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+            self.hits[name] += 1
+            return entry[0]
+        self.misses[name] += 1
+        return None
+
+    def set(self, name: str, key: str, body: bytes, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[(name, key)] = (body, expires_at)
+
+    def invalidate(self, name: str, key: Optional[str] = None):
+        if key is not None:
+            self._entries.pop((name, key), None)
+        else:
+            for entry_key in [entry_key for entry_key in self._entries if entry_key[0] == name]:
+                del self._entries[entry_key]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"hits": self.hits[name], "misses": self.misses[name]}
+            for name in sorted(set(self.hits) | set(self.misses))
+        }
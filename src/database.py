@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DEFAULT_DATABASE_PATH = "/home/eisenmenger/PycharmProjects/time_clock/db.sqlite3"
+DEFAULT_DATABASE_URL = f"sqlite+aiosqlite:///{DEFAULT_DATABASE_PATH}"
+
+# applied to every new SQLite connection, negative cache_size is in KiB
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,
+    "mmap_size": 64 * 1024 * 1024,
+    "foreign_keys": "ON",
+}
+
+SYNC_DRIVERS = {
+    "sqlite+aiosqlite": "sqlite",
+    "postgresql+asyncpg": "postgresql",
+}
+
+
+def database_url() -> str:
+    return os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
+
+
+def set_sqlite_pragmas(engine, pragmas: Dict[str, object]):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def engine_kwargs(url, echo: bool, pool_size: Optional[int], pool_recycle: int, sync: bool):
+    kwargs = dict(echo=echo)
+    if url.get_backend_name() == "sqlite":
+        if pool_size and url.database not in (None, "", ":memory:"):
+            kwargs.update(
+                poolclass=QueuePool if sync else AsyncAdaptedQueuePool,
+                pool_size=pool_size,
+                pool_recycle=pool_recycle,
+            )
+    else:
+        kwargs.update(pool_recycle=pool_recycle, pool_pre_ping=True)
+        if pool_size:
+            kwargs.update(pool_size=pool_size)
+    return kwargs
+
+
+def make_engine(
+    url: Optional[str] = None,
+    echo: bool = False,
+    pool_size: Optional[int] = None,
+    pool_recycle: int = -1,
+    pragmas: Optional[Dict[str, object]] = None,
+):
+    """
+    Create the async engine of the application.
+
+    SQLite connections are tuned with `SQLITE_PRAGMAS` (or `pragmas`),
+    other backends like postgresql+asyncpg get a pre-pinged pool.
+    """
+    url = make_url(url or database_url())
+    engine = create_async_engine(url, **engine_kwargs(url, echo, pool_size, pool_recycle, False))
+    if url.get_backend_name() == "sqlite":
+        set_sqlite_pragmas(engine.sync_engine, SQLITE_PRAGMAS if pragmas is None else pragmas)
+    return engine
+
+
+def make_sync_engine(
+    url: Optional[str] = None,
+    echo: bool = False,
+    pool_size: Optional[int] = None,
+    pool_recycle: int = -1,
+    pragmas: Optional[Dict[str, object]] = None,
+):
+    """Blocking counterpart of `make_engine` for maintenance scripts."""
+    url = make_url(url or database_url())
+    url = url.set(drivername=SYNC_DRIVERS.get(url.drivername, url.drivername))
+    engine = create_engine(url, **engine_kwargs(url, echo, pool_size, pool_recycle, True))
+    if url.get_backend_name() == "sqlite":
+        set_sqlite_pragmas(engine, SQLITE_PRAGMAS if pragmas is None else pragmas)
+    return engine
+
+
+def make_session_factory(engine):
+    return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
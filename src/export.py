@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import argparse
+import asyncio
+import csv
+import datetime
+import sys
+from typing import Optional
+
+from sqlalchemy import and_, case, func, select
+
+from src.models import DailyWorkingTime, Employee
+from src.utils import parse_day
+
+PAYROLL_COLUMNS = (
+    "uid",
+    "name",
+    "days",
+    "worked",
+    "overtime",
+    "break_count",
+    "break_total",
+)
+
+
+def payroll_query(date_from: datetime.date, date_to: datetime.date, daily_hours: float = 8.0):
+    """
+    Aggregate the daily rollups of all employees in one query.
+
+    Every hour above `daily_hours` on a single day counts as overtime.
+    """
+    return (
+        select(
+            Employee.uid,
+            Employee.name,
+            func.count(DailyWorkingTime.work_date).label("days"),
+            func.sum(DailyWorkingTime.worked).label("worked"),
+            func.sum(
+                case(
+                    (
+                        DailyWorkingTime.worked > daily_hours,
+                        DailyWorkingTime.worked - daily_hours,
+                    ),
+                    else_=0,
+                )
+            ).label("overtime"),
+            func.sum(DailyWorkingTime.break_count).label("break_count"),
+            func.sum(DailyWorkingTime.break_total).label("break_total"),
+        )
+        .join(Employee)
+        .filter(
+            and_(
+                DailyWorkingTime.work_date >= date_from,
+                DailyWorkingTime.work_date <= date_to,
+            )
+        )
+        .group_by(Employee.id, Employee.uid, Employee.name)
+        .order_by(Employee.name.asc())
+    )
+
+
+def write_payroll_csv(rows, fp):
+    writer = csv.writer(fp)
+    writer.writerow(PAYROLL_COLUMNS)
+    for row in rows:
+        writer.writerow(
+            [
+                row.uid,
+                row.name,
+                row.days,
+                round(float(row.worked or 0), 2),
+                round(float(row.overtime or 0), 2),
+                row.break_count or 0,
+                round(float(row.break_total or 0), 2),
+            ]
+        )
+
+
+def month_range(today: Optional[datetime.date] = None):
+    today = today or datetime.date.today()
+    return today.replace(day=1), today
+
+
+async def export_payroll(
+    session, fp, date_from: datetime.date, date_to: datetime.date, daily_hours: float = 8.0
+):
+    result = await session.execute(payroll_query(date_from, date_to, daily_hours))
+    write_payroll_csv(result, fp)
+
+
+def main():
+    """Write the payroll of all employees as CSV to stdout or a file."""
+    from dotenv import load_dotenv
+
+    from src.database import database_url, make_engine, make_session_factory
+
+    load_dotenv()
+    default_from, default_to = month_range()
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--from", dest="date_from", default=default_from.isoformat())
+    parser.add_argument("--to", dest="date_to", default=default_to.isoformat())
+    parser.add_argument("--daily-hours", type=float, default=8.0)
+    parser.add_argument("--database-url", default=database_url())
+    parser.add_argument("--output", default="-")
+    args = parser.parse_args()
+
+    async def run():
+        engine = make_engine(args.database_url)
+        session_factory = make_session_factory(engine)
+        fp = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+        try:
+            async with session_factory() as session:
+                await export_payroll(
+                    session,
+                    fp,
+                    parse_day(args.date_from).date(),
+                    parse_day(args.date_to).date(),
+                    args.daily_hours,
+                )
+        finally:
+            if fp is not sys.stdout:
+                fp.close()
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
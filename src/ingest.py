@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+
+from src import statements
+from src.models import CardEvent, DailyWorkingTime, Employee, TimeClock, uuid_str
+from src.shifts import replay
+
+# stay below SQLite's limit of bound parameters per statement
+IN_CHUNK_SIZE = 500
+
+
+class Tap(NamedTuple):
+    uid: str
+    tapped_at: datetime.datetime
+    idempotency_key: str
+
+
+def parse_taps(body: bytes) -> List[Tap]:
+    """
+    Parse a JSON array or NDJSON lines of {uid, timestamp, idempotency_key}.
+
+    The timestamp is given in UTC seconds since the epoch, raises
+    ValueError for malformed documents.
+    """
+    text = body.decode("utf-8").strip()
+    if text.startswith("["):
+        documents = json.loads(text)
+    else:
+        documents = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    taps = []
+    for document in documents:
+        try:
+            uid = document["uid"]
+            idempotency_key = document["idempotency_key"]
+            tapped_at = datetime.datetime.utcfromtimestamp(float(document["timestamp"]))
+        except (KeyError, TypeError, OverflowError, OSError) as exc:
+            raise ValueError(f"invalid tap {document!r}") from exc
+        if not isinstance(uid, str) or not isinstance(idempotency_key, str):
+            raise ValueError(f"invalid tap {document!r}")
+        taps.append(Tap(uid, tapped_at, idempotency_key))
+    return taps
+
+
+def chunks(values: List, size: int = IN_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+async def select_in(session, query, column, values: Iterable):
+    rows = []
+    for chunk in chunks(list(values)):
+        result = await session.execute(query.filter(column.in_(chunk)))
+        rows.extend(result)
+    return rows
+
+
+class Rollup:
+    """Plain accumulator of DailyWorkingTime rows, much cheaper than ORM instances."""
+
+    add_time_clock = DailyWorkingTime.add_time_clock
+
+    def __init__(
+        self,
+        employee_id: int,
+        work_date: datetime.date,
+        worked: float = 0,
+        break_count: int = 0,
+        break_total: float = 0,
+        first_check_in: Optional[datetime.datetime] = None,
+        last_check_out: Optional[datetime.datetime] = None,
+    ):
+        self.employee_id = employee_id
+        self.work_date = work_date
+        self.worked = worked
+        self.break_count = break_count
+        self.break_total = break_total
+        self.first_check_in = first_check_in
+        self.last_check_out = last_check_out
+
+    def update_params(self) -> dict:
+        """Parameters of `statements.update_daily_working_time`."""
+        return {f"b_{name}": value for name, value in vars(self).items()}
+
+
+class OpenEntry(NamedTuple):
+    uuid: str
+    check_in: datetime.datetime
+    stored: bool
+
+
+class ConcurrentCheckOut(Exception):
+    """An open entry of the batch was closed by another process meanwhile."""
+
+
+async def ingest_taps(session, taps: List[Tap], commit: bool = True) -> Dict[str, object]:
+    """
+    Apply a batch of taps with a constant number of queries and one commit.
+
+    The taps of every employee are replayed in timestamp order with the
+    check-in/check-out rules of `src.shifts`, like `database_stuff`. Already processed
+    idempotency keys and unknown uids are skipped, taps older than the open
+    entry of their day are rejected. Returns counters and the new `checked_in`
+    state by uid of all employees with taps, None if only taps of earlier days
+    were applied. With `commit=False` the caller commits, like the group commit
+    writer. Raises ConcurrentCheckOut if another process closed one of the open
+    entries in between.
+    """
+    stats = {"accepted": 0, "duplicates": 0, "unknown": 0, "rejected": 0, "uids": {}}
+
+    unique: Dict[str, Tap] = {}
+    for tap in taps:
+        if tap.idempotency_key in unique:
+            stats["duplicates"] += 1
+        else:
+            unique[tap.idempotency_key] = tap
+    known_keys = {
+        row.idempotency_key
+        for row in await select_in(
+            session, select(CardEvent.idempotency_key), CardEvent.idempotency_key, unique
+        )
+    }
+    stats["duplicates"] += len(known_keys)
+
+    uids = {tap.uid for tap in unique.values()}
+    employees = {
+        row.uid: row.id
+        for row in await select_in(session, select(Employee.id, Employee.uid), Employee.uid, uids)
+    }
+    by_employee: Dict[int, List[Tap]] = defaultdict(list)
+    for key, tap in unique.items():
+        if key in known_keys:
+            continue
+        employee_id = employees.get(tap.uid)
+        if employee_id is None:
+            stats["unknown"] += 1
+            continue
+        by_employee[employee_id].append(tap)
+    if not by_employee:
+        return stats
+
+    # by employee and work date, a tap only closes the open entry of its day
+    open_entries: Dict[Tuple[int, datetime.date], OpenEntry] = {}
+    for row in await select_in(
+        session,
+        select(TimeClock.uuid, TimeClock.check_in, TimeClock.employee_id, TimeClock.work_date)
+        .filter(TimeClock.check_out == None)
+        .order_by(TimeClock.check_in.asc()),
+        TimeClock.employee_id,
+        by_employee,
+    ):
+        open_entries[(row.employee_id, row.work_date)] = OpenEntry(row.uuid, row.check_in, True)
+
+    ordered: List[Tuple[Tuple[int, datetime.date], Tap]] = []
+    for employee_id, employee_taps in by_employee.items():
+        employee_taps.sort(key=lambda tap: tap.tapped_at)
+        for tap in employee_taps:
+            key = (employee_id, tap.tapped_at.date())
+            entry = open_entries.get(key)
+            if entry is not None and tap.tapped_at < entry.check_in:
+                # like the 409 of a live tap, it would open an overlapping entry
+                stats["rejected"] += 1
+                continue
+            ordered.append((key, tap))
+    transitions = replay(
+        ((key, tap.tapped_at) for key, tap in ordered),
+        {key: entry.check_in for key, entry in open_entries.items()},
+    )
+
+    new_entries: Dict[str, dict] = {}
+    closed_entries: List[dict] = []
+    card_events: List[dict] = []
+    checked_in: Dict[int, bool] = {}
+    shifts = []
+    now = datetime.datetime.utcnow()
+    today = datetime.date.today()
+    for (key, tap), transition in zip(ordered, transitions):
+        employee_id, work_date = key
+        if not transition.is_check_out:
+            entry = OpenEntry(uuid_str(), tap.tapped_at, False)
+            open_entries[key] = entry
+            new_entries[entry.uuid] = dict(
+                uuid=entry.uuid,
+                check_in=tap.tapped_at,
+                check_out=None,
+                total=None,
+                employee_id=employee_id,
+                work_date=work_date,
+            )
+            if work_date == today:
+                checked_in[employee_id] = True
+        else:
+            entry = open_entries.pop(key)
+            if entry.stored:
+                closed_entries.append(
+                    dict(b_uuid=entry.uuid, b_check_out=tap.tapped_at, b_total=transition.total)
+                )
+            else:
+                new_entries[entry.uuid].update(check_out=tap.tapped_at, total=transition.total)
+            shifts.append((employee_id, entry.check_in, tap.tapped_at, transition.total))
+            if work_date == today:
+                checked_in[employee_id] = False
+        card_events.append(
+            dict(
+                idempotency_key=tap.idempotency_key,
+                employee_id=employee_id,
+                tapped_at=tap.tapped_at,
+                processed_at=now,
+            )
+        )
+        stats["accepted"] += 1
+
+    if not card_events:
+        return stats
+    if closed_entries:
+        result = await session.execute(statements.check_out_time_clock, closed_entries)
+        if result.rowcount != len(closed_entries):
+            raise ConcurrentCheckOut()
+    if new_entries:
+        await session.execute(statements.insert_time_clock, list(new_entries.values()))
+    if checked_in:
+        await session.execute(
+            statements.set_checked_in,
+            [
+                dict(b_id=employee_id, b_checked_in=state)
+                for employee_id, state in checked_in.items()
+            ],
+        )
+    await session.execute(statements.insert_card_event, card_events)
+    await update_rollups(session, shifts)
+    if commit:
+        await session.commit()
+
+    uids = {employee_id: uid for uid, employee_id in employees.items()}
+    stats["uids"] = {uids[employee_id]: checked_in.get(employee_id) for employee_id in by_employee}
+    return stats
+
+
+async def update_rollups(session, shifts):
+    if not shifts:
+        return
+    days = defaultdict(list)
+    for employee_id, check_in, check_out, total in shifts:
+        days[(employee_id, check_in.date())].append((check_in, check_out, total))
+
+    rollups = {}
+    for row in await select_in(
+        session,
+        select(statements.daily_working_time).where(
+            statements.daily_working_time.c.work_date.between(
+                min(work_date for _, work_date in days), max(work_date for _, work_date in days)
+            )
+        ),
+        statements.daily_working_time.c.employee_id,
+        {employee_id for employee_id, _ in days},
+    ):
+        rollups[(row.employee_id, row.work_date)] = Rollup(**row._mapping)
+
+    new_rollups = []
+    changed_rollups = []
+    for (employee_id, work_date), day_shifts in days.items():
+        daily = rollups.get((employee_id, work_date))
+        if daily is None:
+            daily = Rollup(employee_id, work_date)
+            new_rollups.append(daily)
+        else:
+            changed_rollups.append(daily)
+        for check_in, check_out, total in day_shifts:
+            daily.add_time_clock(check_in, check_out, total)
+
+    # executemany instead of a unit of work flush per object
+    if new_rollups:
+        await session.execute(
+            statements.insert_daily_working_time, [vars(daily) for daily in new_rollups]
+        )
+    if changed_rollups:
+        await session.execute(
+            statements.update_daily_working_time,
+            [daily.update_params() for daily in changed_rollups],
+        )
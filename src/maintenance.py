@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Periodic housekeeping of the database, run on the IOLoop of the server.
+
+- expired web logins are deleted instead of piling up as soft-deleted rows
+- closed time clock entries older than a horizon are moved into per-year
+  `timeclock_archive_<year>` tables, `/list/<uid>?archive=1` still reads them
+- off-peak the free pages are released and the planner statistics refreshed
+"""
+import datetime
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Index, MetaData, Table, and_, delete, inspect, or_, select, text
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import union_all
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.log import app_log
+
+from src.models import RCAuthentication, TimeClock
+
+ARCHIVE_PREFIX = "timeclock_archive_"
+# freed pages released per run, 4096 pages are 16 MiB with the default page size
+VACUUM_PAGES = 4096
+
+archive_metadata = MetaData()
+
+
+def archive_table(year: int) -> Table:
+    """The archive table of `year`, with the columns of timeclock."""
+    name = f"{ARCHIVE_PREFIX}{year}"
+    if name in archive_metadata.tables:
+        return archive_metadata.tables[name]
+    table = Table(
+        name,
+        archive_metadata,
+        *[
+            Column(
+                column.name, column.type, primary_key=column.primary_key, nullable=column.nullable
+            )
+            for column in TimeClock.__table__.columns
+        ],
+    )
+    Index(f"idx_{name}_employee_check_in", table.c.employee_id, table.c.check_in)
+    return table
+
+
+def archive_years(connection) -> List[int]:
+    """Years with an archive table, `connection` is a sync connection."""
+    return sorted(
+        int(name[len(ARCHIVE_PREFIX) :])
+        for name in inspect(connection).get_table_names()
+        if name.startswith(ARCHIVE_PREFIX)
+    )
+
+
+def time_clock_with_archive(years: List[int]):
+    """
+    TimeClock mapped onto a UNION ALL of the live and the archive tables.
+
+    Archived rows keep their ids, so the union holds every id once.
+    """
+    if not years:
+        return TimeClock
+    columns = TimeClock.__table__.columns
+    selects = [select(*columns)] + [select(*archive_table(year).columns) for year in years]
+    return aliased(TimeClock, union_all(*selects).subquery("time_clock"))
+
+
+async def purge_authentications(
+    session, now: datetime.datetime, history_days: int
+) -> Tuple[int, int]:
+    """
+    Delete the web logins of the database which aren't needed anymore.
+
+    Pending logins live in the PendingAuthRegistry and only confirmed ones
+    are stored, failed and abandoned rows are left over from earlier versions
+    and go right away. Successful ones are kept `history_days` as a login history.
+    """
+    failed = await session.execute(
+        delete(RCAuthentication).where(
+            or_(RCAuthentication.success == False, RCAuthentication.success == None)
+        )
+    )
+    succeeded = await session.execute(
+        delete(RCAuthentication).where(
+            and_(
+                RCAuthentication.success == True,
+                RCAuthentication.requested_at < now - datetime.timedelta(days=history_days),
+            )
+        )
+    )
+    await session.commit()
+    return failed.rowcount, succeeded.rowcount
+
+
+async def archive_time_clocks(session, before: datetime.date, batch_size: int = 1000) -> int:
+    """
+    Move closed entries of days before `before` into the archive tables.
+
+    Every batch is its own short transaction, so taps are not blocked
+    by a long running write lock.
+    """
+    moved = 0
+    while True:
+        result = await session.execute(
+            select(TimeClock.id, TimeClock.check_in)
+            .filter(and_(TimeClock.check_out != None, TimeClock.work_date < before))
+            .order_by(TimeClock.id)
+            .limit(batch_size)
+        )
+        by_year: Dict[int, List[int]] = defaultdict(list)
+        for time_clock_id, check_in in result:
+            by_year[check_in.year].append(time_clock_id)
+        if not by_year:
+            return moved
+
+        for year, ids in by_year.items():
+            table = archive_table(year)
+            await session.run_sync(
+                lambda sync_session: table.create(sync_session.connection(), checkfirst=True)
+            )
+            columns = TimeClock.__table__.columns
+            await session.execute(
+                table.insert().from_select(
+                    [column.name for column in columns],
+                    select(*columns).filter(TimeClock.id.in_(ids)),
+                )
+            )
+            await session.execute(delete(TimeClock).where(TimeClock.id.in_(ids)))
+            moved += len(ids)
+        await session.commit()
+
+
+async def compact(engine, vacuum_pages: int = VACUUM_PAGES):
+    """
+    Release free pages and refresh the planner statistics.
+
+    SQLite databases created without auto_vacuum are switched to the
+    incremental mode once, which needs a full VACUUM.
+    """
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        if connection.dialect.name == "sqlite":
+            mode = (await connection.execute(text("PRAGMA auto_vacuum"))).scalar()
+            if mode != 2:
+                await connection.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+                await connection.execute(text("VACUUM"))
+            else:
+                result = await connection.execute(
+                    text(f"PRAGMA incremental_vacuum({vacuum_pages})")
+                )
+                result.fetchall()
+        await connection.execute(text("ANALYZE"))
+
+
+def off_peak(hours: Tuple[int, int], now: Optional[datetime.datetime] = None) -> bool:
+    """Whether the local hour is within [start, end), the range may wrap midnight."""
+    hour = (now or datetime.datetime.now()).hour
+    start, end = hours
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def parse_hours(value: str) -> Tuple[int, int]:
+    start, _, end = value.partition("-")
+    return int(start), int(end)
+
+
+class MaintenanceTask:
+    """
+    Purge expired logins every `interval` seconds, archive and compact off-peak.
+
+    `archive_after_days` of 0 keeps all entries in the live table.
+    """
+
+    def __init__(
+        self,
+        engine,
+        session_factory,
+        interval: float = 3600,
+        auth_history_days: int = 90,
+        archive_after_days: int = 730,
+        hours: Tuple[int, int] = (2, 5),
+    ):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.interval = interval
+        self.auth_history_days = auth_history_days
+        self.archive_after_days = archive_after_days
+        self.hours = hours
+        self.last_compaction: Optional[datetime.date] = None
+        self._callback: Optional[PeriodicCallback] = None
+        self._running = False
+
+    def start(self):
+        if self._callback is None:
+            self._callback = PeriodicCallback(self.run, self.interval * 1000)
+            self._callback.start()
+            IOLoop.current().spawn_callback(self.run)
+
+    def stop(self):
+        if self._callback is not None:
+            self._callback.stop()
+            self._callback = None
+
+    async def run(self):
+        if self._running:
+            return
+        self._running = True
+        try:
+            await self.run_once()
+        except Exception:
+            app_log.exception("database maintenance failed")
+        finally:
+            self._running = False
+
+    async def run_once(self, now: Optional[datetime.datetime] = None) -> Dict[str, int]:
+        now = now or datetime.datetime.utcnow()
+        stats = {}
+        async with self.session_factory() as session:
+            stats["auth_failed"], stats["auth_succeeded"] = await purge_authentications(
+                session, now, self.auth_history_days
+            )
+            if not off_peak(self.hours) or self.last_compaction == now.date():
+                return stats
+            if self.archive_after_days:
+                stats["archived"] = await archive_time_clocks(
+                    session, now.date() - datetime.timedelta(days=self.archive_after_days)
+                )
+        await compact(self.engine)
+        self.last_compaction = now.date()
+        return stats
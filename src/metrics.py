@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Everything is a plain dict lookup and an addition so the metrics can stay
+enabled in production. With --workers every process keeps its own numbers,
+the `pid` label tells them apart.
+"""
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+# seconds, last bucket covers the 60s long-poll of the authentication
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 15, 60)
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+HELP = {
+    "auth_attempts_total": "Web logins waiting for a card tap.",
+    "auth_timeouts_total": "Web logins which ran out of time.",
+    "db_commits_total": "Committed transactions.",
+    "db_queries_total": "Executed SQL statements.",
+    "db_query_seconds": "Duration of SQL statements.",
+    "db_write_lock_wait_seconds": (
+        "Duration of the first write statement of a transaction, includes waiting for the lock."
+    ),
+    "http_request_db_queries_total": "SQL statements executed by requests of a handler.",
+    "http_request_db_seconds_total": "Time spent in SQL statements by requests of a handler.",
+    "http_request_duration_seconds": "Request latency per handler.",
+    "sessions_closed_total": "Closed request database sessions.",
+    "sessions_opened_total": "Opened request database sessions.",
+    "taps_total": "Card taps received by the readers.",
+}
+
+
+class RequestStats:
+    """Database work done on behalf of the current request."""
+
+    __slots__ = ("queries", "query_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+
+
+# every tornado request runs in its own task, so this is per request
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Metrics:
+    """Counters and histograms keyed by name and a tuple of label pairs."""
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[tuple, float]] = defaultdict(lambda: defaultdict(float))
+        self.histograms: Dict[str, Dict[tuple, Histogram]] = defaultdict(dict)
+        self.help: Dict[str, str] = dict(HELP)
+        self.pid = str(os.getpid())
+
+    def inc(self, name: str, value: float = 1, **labels):
+        self.counters[name][tuple(labels.items())] += value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(labels.items())
+        histogram = self.histograms[name].get(key)
+        if histogram is None:
+            histogram = self.histograms[name][key] = Histogram()
+        histogram.observe(value)
+
+    def render(self) -> str:
+        pid = (("pid", self.pid),)
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{format_labels(pid + labels)} {value:g}")
+        for name, series in sorted(self.histograms.items()):
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    le = format_labels(pid + labels + (("le", str(bound)),))
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(pid + labels)} {histogram.sum:g}")
+                lines.append(f"{name}_count{format_labels(pid + labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def instrument_engine(engine, metrics: Metrics):
+    """
+    Count and time every statement of `engine` via the cursor events.
+
+    SQLite takes the write lock with the first write statement of a
+    transaction, waiting up to busy_timeout for other writers. The
+    duration of that statement is recorded as the lock wait time.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("query_started")
+        metrics.inc("db_queries_total")
+        metrics.observe("db_query_seconds", elapsed)
+        if not conn.info.get("holds_write_lock") and statement.lstrip()[:7].upper().startswith(
+            WRITE_STATEMENTS
+        ):
+            conn.info["holds_write_lock"] = True
+            metrics.observe("db_write_lock_wait_seconds", elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += elapsed
+
+    @event.listens_for(sync_engine, "commit")
+    def commit(conn):
+        conn.info.pop("holds_write_lock", None)
+        metrics.inc("db_commits_total")
+
+    @event.listens_for(sync_engine, "rollback")
+    def rollback(conn):
+        conn.info.pop("holds_write_lock", None)
@@ -6,6 +6,7 @@ import uuid
 from sqlalchemy import (
     Boolean,
     Column,
+    Date,
     DateTime,
     Float,
     ForeignKey,
@@ -14,7 +15,7 @@ from sqlalchemy import (
     String,
     UniqueConstraint,
 )
-from tornado_sqlalchemy import declarative_base
+from sqlalchemy.orm import declarative_base
 
 from src.utils import working_time_repr
 
@@ -26,9 +27,15 @@ def uuid_str():
     return str(uuid.uuid4())
 
 
+def work_date_from_check_in(context):
+    check_in = context.get_current_parameters()["check_in"]
+    return check_in.date() if check_in is not None else None
+
+
 class Employee(Base):
     __tablename__ = "employee"
-    id = Column(String, primary_key=True, default=uuid_str)
+    id = Column(Integer, primary_key=True)
+    uuid = Column(String, nullable=False, unique=True, default=uuid_str)
     uid = Column(String)
     name = Column(String)
     active = Column(Boolean, nullable=True, default=True)
@@ -38,7 +45,8 @@ class Employee(Base):
 
 class RCAuthentication(Base):
     __tablename__ = "rcauthentication"
-    id = Column(String, primary_key=True, default=uuid_str)
+    id = Column(Integer, primary_key=True)
+    uuid = Column(String, nullable=False, unique=True, default=uuid_str)
     uid = Column(String)
     requested_at = Column(DateTime, default=datetime.datetime.utcnow)
     authenticated_at = Column(DateTime, nullable=True)
@@ -46,35 +54,17 @@ class RCAuthentication(Base):
     deleted = Column(Boolean, default=False)
     UniqueConstraint("uid", name="rcauthentication_uid_uindex")
 
-    @property
-    def out_of_time(self):
-        return (datetime.datetime.utcnow() - self.requested_at).total_seconds() > 60
-
 
 class TimeClock(Base):
     __tablename__ = "timeclock"
-    id = Column(String, primary_key=True, default=uuid_str)
+    id = Column(Integer, primary_key=True)
+    uuid = Column(String, nullable=False, unique=True, default=uuid_str)
     check_in = Column(DateTime)
     check_out = Column(DateTime, nullable=True)
     total = Column(Float, nullable=True)
     employee_id = Column(Integer, ForeignKey("employee.id"))
-
-    def calculate_total_time(self):
-        if self.check_out is not None:
-            total = self.check_out - self.check_in
-            self.total = total.total_seconds() / HOUR
-        else:
-            total = self.check_in - (self.check_in - datetime.timedelta(hours=0))
-            self.total = total.total_seconds() / HOUR
-
-    def to_dict(self):
-        return {
-            "id": self.id,
-            "check_in": str(self.check_in),
-            "check_out": str(self.check_out),
-            "total": working_time_repr(self.total),
-            "employee_id": self.employee_id,
-        }
+    # DATE(check_in) stored so per-day lookups can use an index
+    work_date = Column(Date, nullable=True, default=work_date_from_check_in)
 
     def __repr__(self):
         return (
@@ -83,22 +73,57 @@ class TimeClock(Base):
         )
 
 
+class CardEvent(Base):
+    """Idempotency keys of the taps delivered by the card readers."""
+
+    __tablename__ = "cardevent"
+    idempotency_key = Column(String, primary_key=True)
+    employee_id = Column(Integer, ForeignKey("employee.id"))
+    tapped_at = Column(DateTime)
+    processed_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class DailyWorkingTime(Base):
+    """Per employee and day rollup of all closed TimeClock entries."""
+
+    __tablename__ = "dailyworkingtime"
+    employee_id = Column(Integer, ForeignKey("employee.id"), primary_key=True)
+    work_date = Column(Date, primary_key=True)
+    worked = Column(Float, default=0)
+    break_count = Column(Integer, default=0)
+    break_total = Column(Float, default=0)
+    first_check_in = Column(DateTime)
+    last_check_out = Column(DateTime)
+
+    def add_time_clock(self, check_in, check_out, total):
+        if self.last_check_out is not None and check_in >= self.last_check_out:
+            self.break_count += 1
+            self.break_total += (check_in - self.last_check_out).total_seconds() / HOUR
+        if self.first_check_in is None or check_in < self.first_check_in:
+            self.first_check_in = check_in
+        if self.last_check_out is None or check_out > self.last_check_out:
+            self.last_check_out = check_out
+        self.worked += total
+
+
 indexes = [
     Index("idx_requested_at_desc", RCAuthentication.requested_at),
     Index("idx_authenticated_at_desc", RCAuthentication.authenticated_at),
     Index("idx_time_clock_check_in_desc", TimeClock.check_in),
     Index("idx_time_clock_check_out_desc", TimeClock.check_out),
+    Index("idx_employee_uid", Employee.uid),
+    Index(
+        "idx_time_clock_employee_work_date",
+        TimeClock.employee_id,
+        TimeClock.work_date,
+        TimeClock.check_out,
+    ),
+    Index("idx_time_clock_employee_check_in", TimeClock.employee_id, TimeClock.check_in),
 ]
 
 
 def migrate():
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
-
-    engine = create_engine(
-        "sqlite:////home/eisenmenger/PycharmProjects/time_clock/db.sqlite3"
-    )
+    from src.database import make_sync_engine
 
-    session = sessionmaker()
-    session.configure(bind=engine)
+    engine = make_sync_engine()
     [idx.create(engine) for idx in indexes]
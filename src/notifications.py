@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import json
+import os
+import socket
+import tempfile
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Set
+
+import tornado.util
+from tornado.ioloop import IOLoop
+from tornado.locks import Event
+
+from src import statements
+
+
+class AuthNotificationHub:
+    """
+    In-process publish/subscribe for finished card authentications.
+
+    A waiting request subscribes with the id of its RCAuthentication row
+    and is woken as soon as `database_stuff` marks that row authenticated,
+    so browsers no longer have to poll the database.
+    """
+
+    def __init__(self):
+        self._waiters: Dict[str, Set[asyncio.Future]] = defaultdict(set)
+        self.broadcast: Optional["ProcessBroadcast"] = None
+
+    def publish(self, auth_id: str, user_uid: str):
+        self.notify(auth_id, user_uid)
+        if self.broadcast is not None:
+            self.broadcast.send({"event": "auth", "auth_id": auth_id, "uid": user_uid})
+
+    def notify(self, auth_id: str, user_uid: str):
+        """Wake the waiters of this process only."""
+        for waiter in self._waiters.pop(auth_id, set()):
+            if not waiter.done():
+                waiter.set_result(user_uid)
+
+    async def wait(self, auth_id: str, timeout: float) -> Optional[str]:
+        """Return the uid of the authenticated user or None on timeout."""
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters[auth_id].add(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout=max(timeout, 0))
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(auth_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[auth_id]
+
+
+class PresenceSubscriber:
+    """
+    Pending presence changes of one connection.
+
+    Changes of the same uid are coalesced, so the buffer holds at most one
+    entry per employee. A client too slow to keep up with `max_buffer`
+    employees loses its buffer and gets a new snapshot instead.
+    """
+
+    def __init__(self, max_buffer: int):
+        self.max_buffer = max_buffer
+        self.pending: Dict[str, bool] = {}
+        self.resync = False
+        self.refresh = False
+        self.closed = False
+        self._wakeup = Event()
+
+    def push(self, user_uid: str, checked_in: bool):
+        self.pending.pop(user_uid, None)
+        if len(self.pending) >= self.max_buffer:
+            self.pending.clear()
+            self.resync = True
+        else:
+            self.pending[user_uid] = checked_in
+        self._wakeup.set()
+
+    def push_refresh(self):
+        self.refresh = True
+        self._wakeup.set()
+
+    def close(self):
+        self.closed = True
+        self._wakeup.set()
+
+    async def wait(self, timeout: float):
+        """Wait until there is something to send or `timeout` seconds passed."""
+        if not (self.pending or self.resync or self.refresh or self.closed):
+            try:
+                await self._wakeup.wait(timeout=datetime.timedelta(seconds=timeout))
+            except tornado.util.TimeoutError:
+                pass
+        self._wakeup.clear()
+
+
+class PresenceHub:
+    """
+    Who is checked in, pushed to the connected boards.
+
+    The state is kept in memory and updated by the taps of this and the
+    sibling processes, connecting boards don't cause database queries.
+    """
+
+    def __init__(self, max_buffer: int = 256):
+        self.max_buffer = max_buffer
+        self._checked_in: Dict[str, bool] = {}
+        self._subscribers: Set[PresenceSubscriber] = set()
+        self.broadcast: Optional["ProcessBroadcast"] = None
+
+    async def load(self, session):
+        result = await session.execute(statements.active_employees)
+        self._checked_in = {row.uid: bool(row.checked_in) for row in result}
+
+    def snapshot(self) -> Dict[str, bool]:
+        return dict(self._checked_in)
+
+    def publish(self, user_uid: str, checked_in: bool):
+        self.notify(user_uid, checked_in)
+        if self.broadcast is not None:
+            self.broadcast.send({"event": "presence", "uid": user_uid, "checked_in": checked_in})
+
+    def notify(self, user_uid: str, checked_in: bool):
+        """Update the boards connected to this process only."""
+        if self._checked_in.get(user_uid) == checked_in:
+            return
+        self._checked_in[user_uid] = checked_in
+        for subscriber in self._subscribers:
+            subscriber.push(user_uid, checked_in)
+
+    def publish_refresh(self):
+        """The list of employees changed, the boards reload it."""
+        for subscriber in self._subscribers:
+            subscriber.push_refresh()
+
+    def subscribe(self) -> PresenceSubscriber:
+        subscriber = PresenceSubscriber(self.max_buffer)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: PresenceSubscriber):
+        self._subscribers.discard(subscriber)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+class ProcessBroadcast:
+    """
+    Forwards events to the sibling processes of a `--workers` setup.
+
+    Every worker binds a Unix datagram socket derived from the port and
+    its task id, messages are small JSON documents sent to all siblings.
+    Delivery is best effort, a worker which is restarting misses them.
+    """
+
+    def __init__(self, port: int, task_id: int, workers: int, directory: Optional[str] = None):
+        self.directory = directory or tempfile.gettempdir()
+        self.port = port
+        self.task_id = task_id
+        self.workers = workers
+        self._socket: Optional[socket.socket] = None
+
+    def path(self, task_id: int) -> str:
+        return os.path.join(self.directory, f"timeclock-{self.port}-{task_id}.sock")
+
+    def listen(self, on_message: Callable[[dict], None]):
+        path = self.path(self.task_id)
+        if os.path.exists(path):
+            os.unlink(path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket.bind(path)
+
+        def on_readable(fd, events):
+            while True:
+                try:
+                    data = self._socket.recv(65536)
+                except BlockingIOError:
+                    return
+                on_message(json.loads(data))
+
+        IOLoop.current().add_handler(self._socket.fileno(), on_readable, IOLoop.READ)
+
+    def send(self, message: dict):
+        if self._socket is None:
+            return
+        data = json.dumps(message).encode()
+        for task_id in range(self.workers):
+            if task_id == self.task_id:
+                continue
+            try:
+                self._socket.sendto(data, self.path(task_id))
+            except (FileNotFoundError, ConnectionRefusedError, BlockingIOError):
+                # the sibling is not (yet) listening or its buffer is full
+                continue
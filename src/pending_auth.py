@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional
+
+from src.models import uuid_str
+
+if TYPE_CHECKING:
+    from src.notifications import ProcessBroadcast
+
+# seconds a web login waits for the card tap
+AUTH_TIMEOUT = 60
+
+
+@dataclass
+class PendingAuth:
+    auth_id: str
+    uid: str
+    requested_at: datetime.datetime
+    authenticated_at: Optional[datetime.datetime] = None
+
+    def expired(self, now: datetime.datetime) -> bool:
+        return (now - self.requested_at).total_seconds() > AUTH_TIMEOUT
+
+    def remaining(self, now: datetime.datetime) -> float:
+        return AUTH_TIMEOUT - (now - self.requested_at).total_seconds()
+
+
+class PendingAuthRegistry:
+    """
+    Web logins waiting for their card tap, kept in memory only.
+
+    All logins live for the same AUTH_TIMEOUT, so the insertion order
+    is the expiry order and expiring is popping from the front of an
+    ordered dict. Creating, matching and expiring are O(1) and don't
+    touch the database, only successful logins are written (by
+    `database_stuff`) for the audit trail.
+
+    With `--workers` new and discarded logins are sent to the sibling
+    processes, so the tap may arrive at any of them.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[str, PendingAuth] = OrderedDict()
+        # the latest pending login per card, an older one is superseded
+        self._by_uid: Dict[str, str] = {}
+        self.broadcast: Optional["ProcessBroadcast"] = None
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def create(self, user_uid: str, now: Optional[datetime.datetime] = None) -> PendingAuth:
+        auth = PendingAuth(uuid_str(), user_uid, now or datetime.datetime.utcnow())
+        self.add(auth)
+        if self.broadcast is not None:
+            self.broadcast.send(
+                {
+                    "event": "auth_request",
+                    "auth_id": auth.auth_id,
+                    "uid": auth.uid,
+                    "requested_at": auth.requested_at.isoformat(),
+                }
+            )
+        return auth
+
+    def add(self, auth: PendingAuth):
+        self._by_id[auth.auth_id] = auth
+        self._by_uid[auth.uid] = auth.auth_id
+
+    def get(self, auth_id: str, now: Optional[datetime.datetime] = None) -> Optional[PendingAuth]:
+        """The pending or authenticated login, None once it expired."""
+        self.expire(now)
+        return self._by_id.get(auth_id)
+
+    def match(
+        self, user_uid: str, now: Optional[datetime.datetime] = None
+    ) -> Optional[PendingAuth]:
+        """Authenticate the latest pending login of the card, if there is one."""
+        now = now or datetime.datetime.utcnow()
+        self.expire(now)
+        auth_id = self._by_uid.pop(user_uid, None)
+        if auth_id is None:
+            return None
+        auth = self._by_id[auth_id]
+        auth.authenticated_at = now
+        return auth
+
+    def authenticated(self, auth_id: str, now: Optional[datetime.datetime] = None):
+        """Apply a login which was authenticated by a sibling process."""
+        auth = self._by_id.get(auth_id)
+        if auth is not None and auth.authenticated_at is None:
+            auth.authenticated_at = now or datetime.datetime.utcnow()
+            if self._by_uid.get(auth.uid) == auth_id:
+                del self._by_uid[auth.uid]
+
+    def discard(self, auth_id: str, broadcast: bool = True):
+        """Forget a login which failed before it expired, later taps of the card check in."""
+        auth = self._by_id.pop(auth_id, None)
+        if auth is None:
+            return
+        if self._by_uid.get(auth.uid) == auth_id:
+            del self._by_uid[auth.uid]
+        if broadcast and self.broadcast is not None:
+            self.broadcast.send({"event": "auth_discard", "auth_id": auth_id})
+
+    def expire(self, now: Optional[datetime.datetime] = None):
+        now = now or datetime.datetime.utcnow()
+        while self._by_id:
+            auth = next(iter(self._by_id.values()))
+            if not auth.expired(now):
+                break
+            del self._by_id[auth.auth_id]
+            if self._by_uid.get(auth.uid) == auth.auth_id:
+                del self._by_uid[auth.uid]
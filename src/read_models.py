@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Read models of the GET endpoints.
+
+The read paths select only the columns they show into named tuples
+instead of loading mapped instances: no identity map, no instance state
+and no attribute instrumentation per row. The formatting of the
+responses lives on these types:
+
+    result = await session.execute(select(*TimeClockRow.columns()).where(...))
+    body = TimeClockRow.json_array(result)
+
+`python -m src.read_models --rows 100000` compares memory and load
+throughput of mapped instances and read models.
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy import insert, select
+
+from src.models import DailyWorkingTime, Employee, TimeClock
+from src.utils import working_time_repr
+
+# `TimeClockRow.to_dict` as JSON
+ENTRY_JSON = '{"id":"%s","check_in":"%s","check_out":"%s","total":%s,"employee_id":%d}'
+
+
+class TimeClockRow(NamedTuple):
+    uuid: str
+    check_in: datetime.datetime
+    check_out: Optional[datetime.datetime]
+    total: Optional[float]
+    employee_id: int
+    # the tie breaker of the keyset pagination, not part of the response
+    id: int
+
+    @classmethod
+    def columns(cls, time_clock=TimeClock) -> tuple:
+        """The selected columns, `time_clock` may be an alias of the archive."""
+        return tuple(getattr(time_clock, name) for name in cls._fields)
+
+    def to_dict(self):
+        return {
+            "id": self.uuid,
+            "check_in": str(self.check_in),
+            "check_out": str(self.check_out),
+            "total": working_time_repr(self.total),
+            "employee_id": self.employee_id,
+        }
+
+    @staticmethod
+    def json_array(rows: Iterable[tuple]) -> bytes:
+        """
+        The JSON of the `to_dict` of every result row, formatted from the
+        tuples without a read model and a dict per row. Uuids, datetimes
+        and working times need no escaping.
+        """
+        entries = ",".join(
+            [
+                ENTRY_JSON
+                % (
+                    uuid,
+                    check_in,
+                    check_out,
+                    "null" if total is None else '"%s"' % working_time_repr(total),
+                    employee_id,
+                )
+                for uuid, check_in, check_out, total, employee_id, _ in rows
+            ]
+        )
+        return f"[{entries}]".encode()
+
+
+class EmployeeRow(NamedTuple):
+    uid: str
+    name: str
+    checked_in: bool
+
+    @classmethod
+    def columns(cls) -> tuple:
+        return tuple(getattr(Employee, name) for name in cls._fields)
+
+
+class DailyWorkingTimeRow(NamedTuple):
+    work_date: datetime.date
+    worked: float
+    break_count: int
+    break_total: float
+    first_check_in: datetime.datetime
+    last_check_out: Optional[datetime.datetime]
+
+    @classmethod
+    def columns(cls) -> tuple:
+        return tuple(getattr(DailyWorkingTime, name) for name in cls._fields)
+
+
+class WorkingTimePeriod:
+    """The daily rollups of one day, week or month added up."""
+
+    __slots__ = (
+        "period",
+        "worked",
+        "break_count",
+        "break_total",
+        "first_check_in",
+        "last_check_out",
+    )
+
+    def __init__(self, period: str, first_check_in: datetime.datetime):
+        self.period = period
+        self.worked = 0
+        self.break_count = 0
+        self.break_total = 0
+        self.first_check_in = first_check_in
+        self.last_check_out = None
+
+    def add(self, daily: DailyWorkingTimeRow):
+        """Add the next day, in the order of the work dates."""
+        self.worked += daily.worked
+        self.break_count += daily.break_count
+        self.break_total += daily.break_total
+        self.last_check_out = daily.last_check_out
+
+    def to_dict(self):
+        return {
+            "period": self.period,
+            "worked": working_time_repr(self.worked),
+            "break_count": self.break_count,
+            "break_total": working_time_repr(self.break_total),
+            "first_check_in": str(self.first_check_in),
+            "last_check_out": str(self.last_check_out),
+        }
+
+
+def measure(session, load) -> dict:
+    """Rows loaded per second by `load(session)` and the memory kept by its result."""
+    session.expunge_all()
+    started = time.perf_counter()
+    count = len(load(session))
+    elapsed = time.perf_counter() - started
+
+    session.expunge_all()
+    gc.collect()
+    tracemalloc.start()
+    rows = load(session)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rows
+    session.expunge_all()
+    return dict(
+        rows=count,
+        rows_per_second=round(count / elapsed),
+        mb_per_100k_rows=round(retained / count * 100000 / 2**20, 1),
+    )
+
+
+def seed(session, rows: int):
+    session.execute(
+        insert(Employee),
+        [
+            dict(uuid=f"e{number}", uid=f"u{number}", name=f"Employee {number}", active=True)
+            for number in range(rows)
+        ],
+    )
+    # the entries of a thousand days per employee
+    employees = max(1, rows // 1000)
+    start = datetime.datetime(2020, 1, 1, 7)
+    entries, dailies = [], []
+    for number in range(rows):
+        check_in = start + datetime.timedelta(days=number // employees)
+        check_out = check_in + datetime.timedelta(hours=8)
+        employee_id = number % employees + 1
+        entries.append(
+            dict(
+                uuid=f"t{number}",
+                check_in=check_in,
+                check_out=check_out,
+                total=8.0,
+                work_date=check_in.date(),
+                employee_id=employee_id,
+            )
+        )
+        dailies.append(
+            dict(
+                employee_id=employee_id,
+                work_date=check_in.date(),
+                worked=8.0,
+                break_count=0,
+                break_total=0.0,
+                first_check_in=check_in,
+                last_check_out=check_out,
+            )
+        )
+    session.execute(insert(TimeClock), entries)
+    session.execute(insert(DailyWorkingTime), dailies)
+    session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mapped instances against read models.")
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    from sqlalchemy.orm import Session
+
+    from src.database import make_sync_engine
+    from src.models import Base
+
+    loads = {
+        "time_clock": (
+            lambda session: session.execute(select(TimeClock)).scalars().all(),
+            lambda session: [
+                TimeClockRow._make(row) for row in session.execute(select(*TimeClockRow.columns()))
+            ],
+        ),
+        "employee": (
+            lambda session: session.execute(select(Employee)).scalars().all(),
+            lambda session: [
+                EmployeeRow._make(row) for row in session.execute(select(*EmployeeRow.columns()))
+            ],
+        ),
+        "daily_working_time": (
+            lambda session: session.execute(select(DailyWorkingTime)).scalars().all(),
+            lambda session: [
+                DailyWorkingTimeRow._make(row)
+                for row in session.execute(select(*DailyWorkingTimeRow.columns()))
+            ],
+        ),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        engine = make_sync_engine(f"sqlite:///{os.path.join(directory, 'read.sqlite3')}")
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            seed(session, args.rows)
+            for name, (entities, read_models) in loads.items():
+                # a first run of each, so both find their statements compiled
+                entities(session)
+                read_models(session)
+                results[name] = dict(
+                    entities=measure(session, entities), read_models=measure(session, read_models)
+                )
+        engine.dispose()
+
+    json.dump(dict(rows=args.rows, results=results), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
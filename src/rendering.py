@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The rendering of the hot endpoints, without work per request that can be done once.
+
+- `load_templates` compiles all templates up front, with `--production`
+  the server renders from this loader and never re-reads the files
+- `PROGRESS_BARS` is the progress bar of the polling login page for
+  every counter
+- the entries of `/list/<uid>` are formatted as JSON straight from the
+  result rows, see `TimeClockRow.json_array`
+
+    python -m src.rendering --rows 1000
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import timeit
+from typing import List
+
+from tornado import template
+
+# the polling login page counts up to this, twice a second
+PROGRESS_STEPS = 60
+
+
+def load_templates(loader: template.BaseLoader, template_path: str) -> template.BaseLoader:
+    """Compile every template of `template_path` into `loader`."""
+    for name in sorted(os.listdir(template_path)):
+        if name.endswith(".html"):
+            loader.load(name)
+    return loader
+
+
+def progress_bar(counter: int) -> str:
+    return (
+        f'<div id="pb" class="progress-bar progress-bar-striped" '
+        f'style="width: {int(counter * 1.6)}%" '
+        f'aria-valuenow="{counter}" aria-valuemin="0" aria-valuemax="{PROGRESS_STEPS}">'
+        f"</div>"
+    )
+
+
+PROGRESS_BARS = tuple(progress_bar(counter) for counter in range(PROGRESS_STEPS + 1))
+
+
+def generate_rows(count: int) -> List[tuple]:
+    check_in = datetime.datetime(2021, 1, 4, 7, 30)
+    rows = []
+    for number in range(count):
+        check_out = check_in + datetime.timedelta(hours=4, minutes=number % 60)
+        total = (check_out - check_in).total_seconds() / 3600
+        uuid = f"{number:08d}-0000-4000-8000-000000000000"
+        rows.append((uuid, check_in, check_out, total, 1, number))
+        check_in += datetime.timedelta(days=1)
+    return rows
+
+
+def best_of(statement, repeat: int, number: int) -> float:
+    """Microseconds of the fastest run of `statement`."""
+    return round(min(timeit.repeat(statement, repeat=repeat, number=number)) / number * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendering time of the hot endpoints.")
+    parser.add_argument("--rows", type=int, default=1000, help="entries of the /list response")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    def run(statement, number=args.number):
+        return best_of(statement, args.repeat, number)
+
+    template_path = os.path.join(os.path.dirname(__file__), "templates")
+    results = {}
+
+    # /list/<uid>: a dict per result row with json, and the rows formatted directly
+    from src.read_models import TimeClockRow
+
+    rows = generate_rows(args.rows)
+    number = max(1, args.number // 10)
+
+    def entries():
+        return [TimeClockRow._make(row).to_dict() for row in rows]
+
+    results["list"] = dict(
+        rows=args.rows,
+        json_us=run(lambda: json.dumps(entries()).encode(), number),
+        json_array_us=run(lambda: TimeClockRow.json_array(rows), number),
+    )
+
+    # /validate/auth/<id>/<counter>: the progress bar and the page around it
+    debug_loader = template.Loader(template_path, autoescape=None)
+    production_loader = template.Loader(template_path, autoescape=None)
+    load_templates(production_loader, template_path)
+
+    def render_debug():
+        # what every request does with `debug=True`
+        debug_loader.reset()
+        return debug_loader.load("proving_auth.html").generate(
+            auth_request_id="auth", counter=31, progress_bar=progress_bar(30), site_prefix=""
+        )
+
+    def render_production():
+        return production_loader.load("proving_auth.html").generate(
+            auth_request_id="auth", counter=31, progress_bar=PROGRESS_BARS[30], site_prefix=""
+        )
+
+    results["validate_auth"] = dict(
+        progress_bar_us=run(lambda: progress_bar(30), args.number * 10),
+        progress_bar_table_us=run(lambda: PROGRESS_BARS[30], args.number * 10),
+        render_debug_us=run(render_debug),
+        render_production_us=run(render_production),
+    )
+
+    # every template, as rendered by the first request after a reset
+    results["templates"] = dict(
+        compile_all_us=run(
+            lambda: load_templates(template.Loader(template_path, autoescape=None), template_path),
+            max(1, args.number // 20),
+        ),
+    )
+
+    json.dump(dict(results=results), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,81 +1,329 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import datetime
 import sys
 from pathlib import Path
+from typing import Optional
 
 import tornado.web
-from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from tornado import template
 from tornado.httpserver import HTTPServer
 from tornado.ioloop import IOLoop
 from tornado.locks import Event
+from tornado.log import app_log
+from tornado.netutil import bind_sockets
 from tornado.options import define, options
-from tornado_sqlalchemy import SQLAlchemy
+from tornado.process import cpu_count, fork_processes
 
+from src.database import database_url, make_engine
+from src.metrics import Metrics, instrument_engine
+from src.notifications import ProcessBroadcast
+from src.pending_auth import PendingAuth
+from src.rendering import load_templates
+from src.sites import DEFAULT_SITE, SiteRegistry
+from src.startup import StartupTimer, warm_up
 from src.template_functions import parse_date
 from src.views import (
+    BatchEntry,
+    CacheStats,
     CreateAuthRequest,
     CreateNewEmployeeRequest,
     InfoCurrentWorkingTime,
     ListEmployeesRequest,
     ListTimes,
     MainHandler,
+    MetricsHandler,
     NewEntry,
+    PayrollExport,
+    PresenceStream,
+    SitesReport,
     ValidateAuthRequest,
+    WaitAuthRequest,
+    WorkingTimeReport,
+    invalidate_caches,
 )
 
-load_dotenv()
-
 BASE_DIR = Path(__file__).parent
-DATABASE_PATH = "/home/eisenmenger/PycharmProjects/time_clock/db.sqlite3"
-DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
-sqla_engine = create_async_engine(DATABASE_URL, echo=True)
 
 define("port", default=8888, help="run on the given port", type=int)
+define("workers", default=1, help="number of server processes, 0 for one per CPU", type=int)
+define(
+    "production",
+    default=False,
+    help="render from templates compiled at startup, without debug mode and autoreload",
+    type=bool,
+)
+define(
+    "auth_long_poll",
+    default=True,
+    help="wait for card authentications via long-poll instead of polling every 500ms",
+    type=bool,
+)
+
+define(
+    "write_batch_latency",
+    default=20,
+    help="max. milliseconds a check-in/check-out waits to be committed with others",
+    type=int,
+)
+define("write_batch_size", default=200, help="max. events per group commit", type=int)
+define("db_echo", default=False, help="log all SQL statements", type=bool)
+define(
+    "db_pool_size",
+    default=5,
+    help="number of pooled database connections, 0 opens one per session",
+    type=int,
+)
+define(
+    "db_pool_recycle",
+    default=-1,
+    help="seconds after which pooled connections are replaced, -1 to never recycle",
+    type=int,
+)
+define(
+    "maintenance_interval",
+    default=60,
+    help="minutes between purges of expired web logins, 0 disables the database maintenance",
+    type=int,
+)
+define(
+    "maintenance_hours",
+    default="2-5",
+    help="local hours (start-end) in which old entries are archived and the database compacted",
+    type=str,
+)
+define(
+    "archive_after_days",
+    default=730,
+    help="move closed entries older than this many days into per-year archive tables, 0 keeps all",
+    type=int,
+)
+define("auth_history_days", default=90, help="days successful web logins are kept", type=int)
+define(
+    "sites",
+    default=[],
+    help="comma separated site ids, served from a DATABASE_URL containing {site}",
+    multiple=True,
+    type=str,
+)
+define("site_domain", default="", help="serve <site>.<site_domain> hosts as that site", type=str)
+define("max_open_sites", default=8, help="databases of idle sites kept open", type=int)
+define(
+    "startup_budget",
+    default=0.0,
+    help="seconds from the process start until listening, a warning is logged above",
+    type=float,
+)
+define(
+    "startup_check",
+    default=False,
+    help="start up, report the startup phases and exit, non-zero above --startup_budget",
+    type=bool,
+)
 
 
 class Application(tornado.web.Application):
-    def __init__(self, db):
+    def __init__(self, engine=None):
         handlers = [
             (r"/", MainHandler),
             (r"/list/employees", ListEmployeesRequest),
             (r"/auth/request/(.*)", CreateAuthRequest),
             (r"/validate/auth/(.*)/([0-9]{1,2})", ValidateAuthRequest),
+            (r"/wait/auth/(.*)", WaitAuthRequest),
             (r"/new-employee/(.*)", CreateNewEmployeeRequest),
+            (r"/add/batch", BatchEntry),
             (r"/add/(.*)", NewEntry),
             (r"/list/(.*)", ListTimes),
             (r"/info/(.*)", InfoCurrentWorkingTime),
+            (r"/report/(.*)", WorkingTimeReport),
+            (r"/export/payroll/(.*)", PayrollExport),
+            (r"/sites/report/(.*)", SitesReport),
+            (r"/cache/stats", CacheStats),
+            (r"/metrics", MetricsHandler),
+            (r"/presence", PresenceStream),
         ]
+        metrics = Metrics()
+
+        def open_engine(url):
+            engine = make_engine(
+                url,
+                echo=options.db_echo,
+                pool_size=options.db_pool_size,
+                pool_recycle=options.db_pool_recycle,
+            )
+            instrument_engine(engine, metrics)
+            return engine
+
+        if engine is None:
+            url = database_url()
+            if "{site}" not in url:
+                engine = open_engine(url)
+        else:
+            url = engine.url.render_as_string(hide_password=False)
+            instrument_engine(engine, metrics)
+        self.sites = SiteRegistry(
+            url,
+            open_engine,
+            site_ids=options.sites,
+            domain=options.site_domain or None,
+            max_open=options.max_open_sites,
+            writer_options=dict(
+                max_latency=options.write_batch_latency / 1000,
+                max_batch=options.write_batch_size,
+            ),
+            engine=engine,
+        )
+        # the database of a single site setup, None with one database per site
+        self.engine = engine
+        template_path = str(BASE_DIR / Path("templates"))
         settings = dict(
             cookie_secret="__TODO:_GENERATE_YOUR_OWN_RANDOM_VALUE_HERE__",
-            template_path=str(BASE_DIR / Path("templates")),
+            template_path=template_path,
             static_path=str(BASE_DIR / Path("static")),
             xsrf_cookies=False,
             # ui_modules={"Post": PostModule},
             debug=True,
+            # autoreload can't restart forked worker processes
+            autoreload=options.workers == 1,
             autoescape=None,
-            db=db,
-            sqla=sessionmaker(sqla_engine, class_=AsyncSession, expire_on_commit=False),
+            sites=self.sites,
+            auth_long_poll=options.auth_long_poll,
+            metrics=metrics,
         )
+        if options.production:
+            # debug mode re-reads and re-compiles every template on each render
+            settings.update(
+                debug=False,
+                autoreload=False,
+                template_loader=load_templates(
+                    template.Loader(template_path, autoescape=None), template_path
+                ),
+            )
         tornado.web.Application.__init__(self, handlers, **settings)
         self.ui_methods["parse_date"] = parse_date
 
+    def find_handler(self, request, **kwargs):
+        request.site_id, request.site_prefix, request.path = self.sites.resolve(
+            request.path, request.host
+        )
+        return super().find_handler(request, **kwargs)
+
+    def on_broadcast(self, message):
+        """Apply an event which happened in one of the sibling processes."""
+        site = self.sites.opened(message.get("site", DEFAULT_SITE))
+        if site is None:
+            # nothing of the site is cached here, but the card may be tapped here
+            if message["event"] != "auth_request":
+                return
+            site = self.sites.get(message["site"])
+        settings = site.settings
+        if message["event"] == "auth":
+            settings["auth_registry"].authenticated(message["auth_id"])
+            settings["auth_hub"].notify(message["auth_id"], message["uid"])
+        elif message["event"] == "auth_request":
+            settings["auth_registry"].add(
+                PendingAuth(
+                    message["auth_id"],
+                    message["uid"],
+                    datetime.datetime.fromisoformat(message["requested_at"]),
+                )
+            )
+        elif message["event"] == "auth_discard":
+            settings["auth_registry"].discard(message["auth_id"], broadcast=False)
+        elif message["event"] == "presence":
+            settings["presence"].notify(message["uid"], message["checked_in"])
+        else:
+            invalidate_caches(settings, message["event"], message["uid"], broadcast=False)
 
-async def main():
+
+async def start(
+    sockets=None,
+    task_id: Optional[int] = None,
+    workers: int = 1,
+    timer: Optional[StartupTimer] = None,
+) -> HTTPServer:
+    """Construct and warm up the tornado application, then listen."""
+    timer = timer or StartupTimer()
+    application = Application()
+    timer.mark("application")
+    if task_id is not None:
+        broadcast = ProcessBroadcast(options.port, task_id, workers)
+        broadcast.listen(application.on_broadcast)
+        application.sites.set_broadcast(broadcast)
+    await warm_up(application, timer)
+    # one process is enough to keep the shared database tidy, with one
+    # database per site there is no engine at startup
+    if options.maintenance_interval and not task_id and application.engine is not None:
+        from src.maintenance import MaintenanceTask, parse_hours
+
+        MaintenanceTask(
+            application.engine,
+            application.sites.get(DEFAULT_SITE).sqla,
+            interval=options.maintenance_interval * 60,
+            auth_history_days=options.auth_history_days,
+            archive_after_days=options.archive_after_days,
+            hours=parse_hours(options.maintenance_hours),
+        ).start()
+    http_server = HTTPServer(application)
+    if sockets is not None:
+        http_server.add_sockets(sockets)
+    else:
+        http_server.listen(options.port)
+    timer.mark("listen")
+
+    if not task_id:
+        sys.stdout.write(timer.report())
+        if options.startup_budget and timer.total > options.startup_budget:
+            app_log.warning(
+                "startup took %.2fs, the budget is %.2fs", timer.total, options.startup_budget
+            )
+    return http_server
+
+
+async def main(sockets=None, task_id: Optional[int] = None, workers: int = 1):
     """Construct and serve the tornado application."""
+    await start(sockets, task_id, workers)
+    sys.stdout.write(f"Listening on http://localhost:{options.port}\n\n")
+
+    shutdown_event = Event()
+    await shutdown_event.wait()
+
+
+async def check_startup() -> int:
+    """Start up once and stop, the exit code tells whether the budget was kept."""
+    timer = StartupTimer()
+    http_server = await start(timer=timer)
+    http_server.stop()
+    return int(bool(options.startup_budget) and timer.total > options.startup_budget)
+
+
+def run():
+    from dotenv import load_dotenv
+
+    load_dotenv()
     tornado.options.parse_command_line()
     # for command line parameters
     # if not (options.facebook_api_key and options.facebook_secret):
     #     print("--facebook_api_key and --facebook_secret must be set")
     #     return
-    http_server = tornado.httpserver.HTTPServer(Application(SQLAlchemy(DATABASE_URL)))
-    http_server.listen(options.port)
-    sys.stdout.write(f"Listening on http://localhost:{options.port}\n\n")
+    if options.startup_check:
+        sys.exit(IOLoop.current().run_sync(check_startup))
+    if options.workers == 1:
+        IOLoop.current().run_sync(main)
+        return
 
-    shutdown_event = Event()
-    await shutdown_event.wait()
+    # all processes share the listening socket, SQLite writes of the
+    # workers are serialized by WAL mode and the busy_timeout pragma
+    workers = options.workers or cpu_count()
+    if workers > cpu_count():
+        # more processes than CPUs only add context switches and cold per-process caches
+        app_log.warning(
+            "%d workers on %d CPUs, use --workers=0 for one per CPU", workers, cpu_count()
+        )
+    sockets = bind_sockets(options.port)
+    task_id = fork_processes(workers)
+    IOLoop.current().run_sync(lambda: main(sockets, task_id, workers))
 
 
 if __name__ == "__main__":
-    IOLoop.current().run_sync(main)
+    run()
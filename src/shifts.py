@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The check-in/check-out rules of the card taps, without a database.
+
+Within a work day the taps of an employee alternate between check-in and
+check-out: a tap checks out of the entry the employee checked in to on
+the same day, otherwise it checks in. An entry left open on an earlier
+day stays open, the first tap of a new day checks in. A tap older than
+the check-in of the open entry doesn't close it either.
+
+`replay` applies the rules tap by tap as a generator, `replay_batch`
+applies them to whole columns with NumPy (optional, `pip install numpy`,
+imported on the first call since the server loads this module at startup).
+The only state is the check-in of the open entry per employee, so taps
+can be replayed, backfilled and recomputed in memory and written with
+a few executemany statements:
+
+    python -m src.shifts --events 2000000 --employees 500
+"""
+
+import argparse
+import datetime
+import json
+import random
+import sys
+import time
+from typing import TYPE_CHECKING, Dict, Hashable, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from src.models import HOUR
+
+if TYPE_CHECKING:
+    import numpy
+
+
+class Transition(NamedTuple):
+    key: Hashable
+    tapped_at: datetime.datetime
+    # the check-in of the entry, `tapped_at` for check-ins
+    check_in: datetime.datetime
+    # hours of the closed entry, None for check-ins
+    total: Optional[float]
+
+    @property
+    def is_check_out(self) -> bool:
+        return self.total is not None
+
+
+class BatchTransitions(NamedTuple):
+    is_check_out: "numpy.ndarray"
+    check_in: "numpy.ndarray"
+    # NaN for check-ins
+    total: "numpy.ndarray"
+
+
+def closes(open_check_in: Optional[datetime.datetime], tapped_at: datetime.datetime) -> bool:
+    """Whether a tap at `tapped_at` checks out of the entry checked in at `open_check_in`."""
+    return (
+        open_check_in is not None
+        and open_check_in.date() == tapped_at.date()
+        and tapped_at >= open_check_in
+    )
+
+
+def hours_between(check_in: datetime.datetime, check_out: datetime.datetime) -> float:
+    return (check_out - check_in).total_seconds() / HOUR
+
+
+def replay(
+    taps: Iterable[Tuple[Hashable, datetime.datetime]],
+    open_entries: Optional[Dict[Hashable, datetime.datetime]] = None,
+) -> Iterator[Transition]:
+    """
+    The transition of every (key, tapped_at) tap, ordered by time per key.
+
+    `open_entries` maps keys (uids or employee ids) to the check-in of
+    their open entry, it is updated in place.
+    """
+    if open_entries is None:
+        open_entries = {}
+    for key, tapped_at in taps:
+        check_in = open_entries.get(key)
+        if closes(check_in, tapped_at):
+            del open_entries[key]
+            yield Transition(key, tapped_at, check_in, hours_between(check_in, tapped_at))
+        else:
+            open_entries[key] = tapped_at
+            yield Transition(key, tapped_at, tapped_at, None)
+
+
+def replay_batch(
+    keys, timestamps, open_entries: Optional[Dict[Hashable, datetime.datetime]] = None
+) -> BatchTransitions:
+    """
+    `replay` of whole columns, grouped by key and ordered by time per key.
+
+    The taps of a key and day alternate, so whether a tap checks out only
+    depends on its position within the day and on an open entry of that
+    day before the batch. Python loops run once per key, not per tap.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("replay_batch needs NumPy, use replay instead") from None
+    if open_entries is None:
+        open_entries = {}
+    keys = numpy.asarray(keys)
+    timestamps = numpy.asarray(timestamps, dtype="datetime64[us]")
+    if not len(keys):
+        return BatchTransitions(
+            numpy.zeros(0, dtype=bool), timestamps.copy(), numpy.zeros(0, dtype=float)
+        )
+
+    days = timestamps.astype("datetime64[D]")
+    new_key = numpy.ones(len(keys), dtype=bool)
+    new_key[1:] = keys[1:] != keys[:-1]
+    new_day = new_key.copy()
+    new_day[1:] |= days[1:] != days[:-1]
+    day_index = numpy.cumsum(new_day) - 1
+    position = numpy.arange(len(keys)) - numpy.flatnonzero(new_day)[day_index]
+
+    # only the first day of a key can continue an entry opened before the batch
+    check_in = timestamps.copy()
+    continued = numpy.zeros(day_index[-1] + 1, dtype=numpy.int64)
+    for index in numpy.flatnonzero(new_key):
+        open_check_in = open_entries.get(keys[index].item())
+        if (
+            open_check_in is not None
+            and numpy.datetime64(open_check_in, "D") == days[index]
+            and timestamps[index] >= numpy.datetime64(open_check_in, "us")
+        ):
+            continued[day_index[index]] = 1
+            check_in[index] = numpy.datetime64(open_check_in, "us")
+
+    is_check_out = (position + continued[day_index]) % 2 == 1
+    checks_out_previous = is_check_out & (position > 0)
+    check_in[1:][checks_out_previous[1:]] = timestamps[:-1][checks_out_previous[1:]]
+    hours = (timestamps - check_in) / numpy.timedelta64(1, "h")
+    total = numpy.where(is_check_out, hours, numpy.nan)
+
+    last_of_key = numpy.ones(len(keys), dtype=bool)
+    last_of_key[:-1] = new_key[1:]
+    for index in numpy.flatnonzero(last_of_key):
+        if is_check_out[index]:
+            open_entries.pop(keys[index].item(), None)
+        else:
+            open_entries[keys[index].item()] = timestamps[index].item()
+    return BatchTransitions(is_check_out, check_in, total)
+
+
+def generate_taps(events: int, employees: int, seed: int = 0):
+    """`events` taps of two shifts a day per employee, grouped by employee."""
+    rng = random.Random(seed)
+    start = datetime.datetime.combine(datetime.date.today(), datetime.time(7))
+    taps = []
+    per_employee = events // employees
+    for employee in range(employees):
+        day = start - datetime.timedelta(days=per_employee // 4 + 1)
+        for number in range(per_employee):
+            if number % 4 == 0:
+                day += datetime.timedelta(days=1)
+                tapped_at = day + datetime.timedelta(minutes=rng.randint(0, 120))
+            else:
+                tapped_at += datetime.timedelta(minutes=rng.randint(30, 270))
+            taps.append((employee, tapped_at))
+    return taps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay throughput of the shift rules.")
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    taps = generate_taps(args.events, args.employees, args.seed)
+    results = {}
+
+    started = time.perf_counter()
+    check_outs = sum(transition.is_check_out for transition in replay(taps))
+    elapsed = time.perf_counter() - started
+    results["replay"] = dict(
+        seconds=round(elapsed, 3), events_per_second=round(len(taps) / elapsed)
+    )
+
+    if numpy is not None:
+        keys = numpy.fromiter((key for key, _ in taps), dtype=numpy.int64, count=len(taps))
+        timestamps = numpy.array([tapped_at for _, tapped_at in taps], dtype="datetime64[us]")
+        started = time.perf_counter()
+        batch = replay_batch(keys, timestamps)
+        elapsed = time.perf_counter() - started
+        if int(batch.is_check_out.sum()) != check_outs:
+            raise RuntimeError("replay and replay_batch disagree")
+        results["replay_batch"] = dict(
+            seconds=round(elapsed, 3), events_per_second=round(len(taps) / elapsed)
+        )
+
+    report = dict(events=len(taps), employees=args.employees, results=results)
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
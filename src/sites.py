@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+One database per site (location) instead of one file for all terminals.
+
+A `DATABASE_URL` containing `{site}`, e.g.
+
+    sqlite+aiosqlite:////var/lib/timeclock/{site}.sqlite3
+
+is opened once per site listed in `--sites`. The site of a request is
+the `/site/<site>` path prefix or the first label of the host name below
+`--site_domain`. Each site has its own engine, session factory, group
+commit writer and in-memory caches, so terminals of different sites
+don't queue behind each other's write lock. Sites are opened on their
+first request and the least recently used idle ones are closed again.
+"""
+import asyncio
+import re
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from tornado.ioloop import IOLoop
+
+from src.cache import EmployeeStateCache, FragmentCache
+from src.database import make_session_factory
+from src.notifications import AuthNotificationHub, PresenceHub
+from src.pending_auth import PendingAuthRegistry
+from src.writer import GroupCommitWriter
+
+if TYPE_CHECKING:
+    from src.notifications import ProcessBroadcast
+
+DEFAULT_SITE = "default"
+SITE_ID = re.compile(r"[a-z0-9][a-z0-9_-]{0,31}")
+SITE_PREFIX = re.compile(r"/site/([a-z0-9][a-z0-9_-]{0,31})(/.*)?")
+
+
+class SiteBroadcast:
+    """Tags the events of a site before they are sent to the sibling processes."""
+
+    def __init__(self, broadcast: "ProcessBroadcast", site_id: str):
+        self.broadcast = broadcast
+        self.site_id = site_id
+
+    def send(self, message: dict):
+        self.broadcast.send({**message, "site": self.site_id})
+
+
+class Site:
+    """The database and the in-memory state of one site."""
+
+    def __init__(self, site_id: str, engine, writer_options: Dict):
+        self.site_id = site_id
+        self.engine = engine
+        self.sqla = make_session_factory(engine)
+        self.users = 0
+        self.loaded = False
+        self.settings = dict(
+            site_id=site_id,
+            sqla=self.sqla,
+            auth_hub=AuthNotificationHub(),
+            auth_registry=PendingAuthRegistry(),
+            presence=PresenceHub(),
+            employee_cache=EmployeeStateCache(),
+            fragment_cache=FragmentCache(),
+            writer=GroupCommitWriter(self.sqla, **writer_options),
+        )
+        self.set_broadcast(None)
+
+    def set_broadcast(self, broadcast: Optional["ProcessBroadcast"]):
+        if broadcast is not None:
+            broadcast = SiteBroadcast(broadcast, self.site_id)
+        self.settings["broadcast"] = broadcast
+        for name in ("auth_hub", "auth_registry", "presence"):
+            self.settings[name].broadcast = broadcast
+
+    async def load(self):
+        """Fill the employee cache and the presence board from the database."""
+        async with self.sqla() as session:
+            await self.settings["employee_cache"].load(session)
+            await self.settings["presence"].load(session)
+        self.loaded = True
+
+    @property
+    def idle(self) -> bool:
+        return self.users == 0 and not len(self.settings["presence"])
+
+    async def close(self):
+        self.settings["writer"].stop()
+        await self.engine.dispose()
+
+
+class SiteRegistry:
+    """
+    The open sites, closing the least recently used idle one beyond `max_open`.
+
+    With a `url` without `{site}` there is only the `DEFAULT_SITE`, served
+    by `engine` if given.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        open_engine: Callable[[str], object],
+        site_ids: Optional[List[str]] = None,
+        domain: Optional[str] = None,
+        max_open: int = 8,
+        writer_options: Optional[Dict] = None,
+        engine=None,
+    ):
+        self.url = url
+        self.multi_site = "{site}" in url
+        self.open_engine = open_engine
+        self.site_ids = list(site_ids or []) if self.multi_site else [DEFAULT_SITE]
+        for site_id in self.site_ids:
+            if not SITE_ID.fullmatch(site_id):
+                raise ValueError(f"invalid site id {site_id!r}")
+        if self.multi_site and not self.site_ids:
+            raise ValueError("DATABASE_URL contains {site}, but no sites are configured")
+        self.domain = domain
+        self.max_open = max_open
+        self.writer_options = writer_options or {}
+        self.broadcast: Optional["ProcessBroadcast"] = None
+        self._sites: Dict[str, Site] = OrderedDict()
+        if engine is not None and not self.multi_site:
+            self._sites[DEFAULT_SITE] = Site(DEFAULT_SITE, engine, self.writer_options)
+
+    def __len__(self):
+        return len(self._sites)
+
+    def resolve(self, path: str, host: str) -> Tuple[Optional[str], str, str]:
+        """
+        The site id, the URL prefix of the site and the path without it.
+
+        The site id is None for requests of unknown sites.
+        """
+        if not self.multi_site:
+            return DEFAULT_SITE, "", path
+        match = SITE_PREFIX.fullmatch(path)
+        if match is not None:
+            site_id, prefix, path = match.group(1), f"/site/{match.group(1)}", match.group(2)
+        else:
+            site_id, prefix = None, ""
+            hostname = host.partition(":")[0].lower()
+            if self.domain and hostname.endswith(f".{self.domain}"):
+                site_id = hostname[: -len(self.domain) - 1]
+        if site_id not in self.site_ids:
+            site_id = None
+        return site_id, prefix, path or "/"
+
+    def get(self, site_id: str) -> Site:
+        """The site, opened if needed, without loading its caches."""
+        site = self._sites.get(site_id)
+        if site is not None:
+            self._sites.move_to_end(site_id)
+            return site
+        if site_id not in self.site_ids:
+            raise KeyError(site_id)
+        self.evict(self.max_open - 1)
+        engine = self.open_engine(self.url.replace("{site}", site_id))
+        site = Site(site_id, engine, self.writer_options)
+        site.set_broadcast(self.broadcast)
+        self._sites[site_id] = site
+        return site
+
+    def opened(self, site_id: str) -> Optional[Site]:
+        return self._sites.get(site_id)
+
+    async def acquire(self, site_id: str) -> Site:
+        """The loaded site, it isn't closed until it is released."""
+        site = self.get(site_id)
+        site.users += 1
+        if not site.loaded:
+            try:
+                await site.load()
+            except Exception:
+                site.users -= 1
+                raise
+        return site
+
+    def release(self, site: Site):
+        site.users -= 1
+        self.evict()
+
+    def set_broadcast(self, broadcast: "ProcessBroadcast"):
+        self.broadcast = broadcast
+        for site in self._sites.values():
+            site.set_broadcast(broadcast)
+
+    def evict(self, keep: Optional[int] = None):
+        """Close idle sites, least recently used first, until `keep` are left."""
+        if not self.multi_site:
+            return
+        keep = self.max_open if keep is None else keep
+        for site_id in [site_id for site_id, site in self._sites.items() if site.idle]:
+            if len(self._sites) <= keep:
+                return
+            IOLoop.current().spawn_callback(self._sites.pop(site_id).close)
+
+    async def gather(self, query: Callable[[object], Awaitable]) -> Dict[str, object]:
+        """
+        Run `query(session)` against every site concurrently, results by site id.
+
+        At most `max_open` sites are queried at the same time.
+        """
+        limit = asyncio.Semaphore(self.max_open)
+
+        async def run(site_id):
+            async with limit:
+                site = await self.acquire(site_id)
+                try:
+                    async with site.sqla() as session:
+                        return site_id, await query(session)
+                finally:
+                    self.release(site)
+
+        return dict(await asyncio.gather(*(run(site_id) for site_id in self.site_ids)))
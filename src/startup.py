@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup time of the server, from the start of the process until it listens.
+
+    python -m src.startup --budget 3
+
+runs `runserver.py --startup_check` with `-X importtime` against a
+temporary SQLite database, prints the slowest imports and the time of
+each startup phase and fails if the server took longer than the budget.
+
+The timer counts from the start of the process, the interpreter start
+and the imports of the server are its first phase.
+"""
+import argparse
+import datetime
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+
+def process_age() -> float:
+    """Seconds since this process was started, 0 where /proc is not available."""
+    try:
+        with open("/proc/self/stat") as fp:
+            # the fields after the parenthesized command, starttime is field 22
+            started = int(fp.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as fp:
+            uptime = float(fp.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return max(0.0, uptime - started / os.sysconf("SC_CLK_TCK"))
+
+
+class StartupTimer:
+    """
+    Durations of the startup phases.
+
+    The first phase is everything before the timer was created, the
+    interpreter start and the imports.
+    """
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = [("interpreter and imports", process_age())]
+        self._last = time.perf_counter()
+
+    def mark(self, phase: str):
+        """End `phase`, it started with the previous mark."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return sum(seconds for _, seconds in self.phases)
+
+    def report(self) -> str:
+        lines = [f"{phase:<26}{seconds * 1000:>9.1f} ms" for phase, seconds in self.phases]
+        lines.append(f"{'startup':<26}{self.total * 1000:>9.1f} ms")
+        return "\n".join(lines) + "\n"
+
+
+async def warm_up(application, timer: Optional[StartupTimer] = None):
+    """
+    Do the work of the first requests before the socket listens.
+
+    Compiles all templates (debug mode compiles them again on every
+    request, see `--production`), configures the mappers, opens a
+    database connection and runs the pre-built statements once, so they
+    are in the compiled cache of the engine, and fills the caches. With one
+    database per site the sites are still opened by their first request.
+    """
+    from sqlalchemy.orm import configure_mappers
+    from tornado import template
+    from tornado.web import RequestHandler
+
+    from src.rendering import load_templates
+    from src.sites import DEFAULT_SITE
+
+    settings = application.settings
+    template_path = settings["template_path"]
+    loader = settings.get("template_loader")
+    if loader is None:
+        # the loader RequestHandler.create_template_loader would create on the first render
+        with RequestHandler._template_loader_lock:
+            loader = RequestHandler._template_loaders.get(template_path)
+            if loader is None:
+                kwargs = {}
+                if "autoescape" in settings:
+                    kwargs["autoescape"] = settings["autoescape"]
+                if "template_whitespace" in settings:
+                    kwargs["whitespace"] = settings["template_whitespace"]
+                loader = template.Loader(template_path, **kwargs)
+                RequestHandler._template_loaders[template_path] = loader
+    load_templates(loader, template_path)
+    configure_mappers()
+    if timer is not None:
+        timer.mark("templates and mappers")
+
+    if application.engine is None:
+        return
+    site = application.sites.get(DEFAULT_SITE)
+    await warm_statements(site.engine)
+    if timer is not None:
+        timer.mark("database connection")
+    await site.load()
+    if timer is not None:
+        timer.mark("caches")
+
+
+async def warm_statements(engine):
+    from src import statements
+    from src.working_time import working_time_query
+
+    today = datetime.date.today()
+    queries = [
+        (statements.active_employees, {}),
+        (statements.employee_by_uid, {"uid": ""}),
+        (statements.open_time_clocks, {"work_date": today}),
+        (statements.open_time_clock_of_employee, {"employee_id": 0, "work_date": today}),
+        (statements.card_event_exists, {"idempotency_key": ""}),
+        (statements.daily_working_time_of_day, {"employee_id": 0, "work_date": today}),
+        (statements.authenticated_uid, {"auth_id": ""}),
+        (
+            working_time_query,
+            {"uid": "", "date_from": today, "date_to": today, "now": datetime.datetime.utcnow()},
+        ),
+    ]
+    async with engine.connect() as connection:
+        for statement, parameters in queries:
+            (await connection.execute(statement, parameters)).fetchall()
+
+
+def parse_import_times(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) of the `-X importtime` output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, module = line[len("import time:") :].split("|", 2)
+        if own.strip().isdigit():
+            imports.append((module.strip(), int(own), int(cumulative)))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds until listening")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports shown")
+    parser.add_argument("--database", help="SQLite file, an empty temporary one by default")
+    args = parser.parse_args()
+
+    temporary = None
+    if args.database is None:
+        from src.database import make_sync_engine
+        from src.models import Base
+
+        temporary = tempfile.TemporaryDirectory()
+        args.database = os.path.join(temporary.name, "startup.sqlite3")
+        engine = make_sync_engine(f"sqlite:///{args.database}")
+        Base.metadata.create_all(engine)
+        engine.dispose()
+
+    env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{args.database}")
+    command = [
+        sys.executable,
+        "-X",
+        "importtime",
+        "-m",
+        "src.runserver",
+        "--startup_check",
+        f"--startup_budget={args.budget}",
+        "--port=0",
+        "--workers=1",
+        "--maintenance_interval=0",
+    ]
+    try:
+        process = subprocess.run(command, env=env, capture_output=True, text=True)
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+
+    imports = parse_import_times(process.stderr)
+    sys.stdout.write(f"{'self ms':>9}{'cumulative ms':>15}  module\n")
+    slowest = sorted(imports, key=lambda row: row[2], reverse=True)[: args.top]
+    for module, own, cumulative in slowest:
+        sys.stdout.write(f"{own / 1000:>9.1f}{cumulative / 1000:>15.1f}  {module}\n")
+    sys.stdout.write("\n")
+    sys.stdout.write(process.stdout)
+    errors = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+    if errors:
+        sys.stderr.write("\n".join(errors) + "\n")
+    sys.exit(process.returncode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pre-built statements of the hot paths (taps, cache loads, logins).
+
+They are constructed once at import time with bindparam() placeholders
+and run against the tables instead of the mapped classes. Executing one
+skips building the construct, SQLAlchemy finds the compiled form in its
+cache and sqlite3 reuses the prepared statement of the identical SQL.
+The ORM unit of work, autoflush and the synchronization of ORM-enabled
+UPDATEs are skipped as well. Values are passed as parameters:
+
+    await session.execute(statements.employee_by_uid, {"uid": user_uid})
+"""
+from sqlalchemy import and_, bindparam, insert, select, update
+
+from src.models import CardEvent, DailyWorkingTime, Employee, RCAuthentication, TimeClock
+
+employee = Employee.__table__
+time_clock = TimeClock.__table__
+card_event = CardEvent.__table__
+daily_working_time = DailyWorkingTime.__table__
+rc_authentication = RCAuthentication.__table__
+
+active_employees = select(employee.c.id, employee.c.uid, employee.c.checked_in).where(
+    employee.c.active == True
+)
+
+employee_by_uid = select(employee.c.id, employee.c.uid, employee.c.checked_in).where(
+    employee.c.uid == bindparam("uid")
+)
+
+# the open entries of `work_date`, the latest last
+open_time_clocks = (
+    select(time_clock.c.uuid, time_clock.c.check_in, time_clock.c.employee_id)
+    .where(and_(time_clock.c.work_date == bindparam("work_date"), time_clock.c.check_out == None))
+    .order_by(time_clock.c.check_in.asc())
+)
+
+open_time_clock_of_employee = (
+    select(time_clock.c.uuid, time_clock.c.check_in)
+    .where(
+        and_(
+            time_clock.c.employee_id == bindparam("employee_id"),
+            time_clock.c.work_date == bindparam("work_date"),
+            time_clock.c.check_out == None,
+        )
+    )
+    .order_by(time_clock.c.check_in.desc())
+    .limit(1)
+)
+
+card_event_exists = select(card_event.c.idempotency_key).where(
+    card_event.c.idempotency_key == bindparam("idempotency_key")
+)
+
+insert_card_event = insert(card_event)
+
+insert_time_clock = insert(time_clock)
+
+# b_ prefixed, the plain column names are reserved for the SET clause
+# only open entries, a stale cached entry matches no row
+check_out_time_clock = (
+    update(time_clock)
+    .where(and_(time_clock.c.uuid == bindparam("b_uuid"), time_clock.c.check_out.is_(None)))
+    .values(check_out=bindparam("b_check_out"), total=bindparam("b_total"))
+)
+
+set_checked_in = (
+    update(employee)
+    .where(employee.c.id == bindparam("b_id"))
+    .values(checked_in=bindparam("b_checked_in"))
+)
+
+daily_working_time_of_day = select(daily_working_time).where(
+    and_(
+        daily_working_time.c.employee_id == bindparam("employee_id"),
+        daily_working_time.c.work_date == bindparam("work_date"),
+    )
+)
+
+insert_daily_working_time = insert(daily_working_time)
+
+update_daily_working_time = (
+    update(daily_working_time)
+    .where(
+        and_(
+            daily_working_time.c.employee_id == bindparam("b_employee_id"),
+            daily_working_time.c.work_date == bindparam("b_work_date"),
+        )
+    )
+    .values(
+        worked=bindparam("b_worked"),
+        break_count=bindparam("b_break_count"),
+        break_total=bindparam("b_break_total"),
+        first_check_in=bindparam("b_first_check_in"),
+        last_check_out=bindparam("b_last_check_out"),
+    )
+)
+
+insert_authentication = insert(rc_authentication)
+
+authenticated_uid = select(rc_authentication.c.uid).where(
+    rc_authentication.c.uuid == bindparam("auth_id")
+)
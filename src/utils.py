@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import datetime
 
 
 def working_time_repr(total_time: float) -> str:
@@ -7,3 +8,7 @@ def working_time_repr(total_time: float) -> str:
         hours = int(total_time)
         minutes = int(round(((total_time % 1) * 0.6) * 100, 1))
         return f"{hours} hours {minutes} minutes"
+
+
+def parse_day(value: str) -> datetime.datetime:
+    return datetime.datetime.strptime(value, "%Y-%m-%d")
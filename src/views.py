@@ -1,28 +1,89 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import datetime
+import io
 import json
 import os
 from datetime import date
 from typing import Awaitable, Optional
 
 import tornado.web
-from sqlalchemy import and_, func, select
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.exc import IntegrityError
 from tornado.escape import json_decode
-
-from src.models import HOUR, Employee, RCAuthentication, TimeClock
-from src.utils import working_time_repr
+from tornado.iostream import StreamClosedError
+
+from src import statements
+from src.cache import EmployeeStateCache
+from src.ingest import ConcurrentCheckOut, parse_taps
+from src.metrics import Metrics, RequestStats, current_request
+from src.models import DailyWorkingTime, Employee, TimeClock, uuid_str
+from src.pending_auth import AUTH_TIMEOUT, PendingAuthRegistry
+from src.read_models import DailyWorkingTimeRow, EmployeeRow, TimeClockRow, WorkingTimePeriod
+from src.rendering import PROGRESS_BARS, PROGRESS_STEPS
+from src.shifts import hours_between
+from src.sites import DEFAULT_SITE
+from src.utils import parse_day, working_time_repr
+from src.working_time import working_time
+from src.writer import CheckIn, CheckOut, TapBatch, record_card_event
+
+
+def invalidate_caches(settings, event, user_uid, broadcast=True):
+    """
+    Drop everything cached about `user_uid` after a tap or a new employee.
+
+    The event is forwarded to the other worker processes unless it
+    was received from one of them.
+    """
+    if event == "employee":
+        settings["employee_cache"].invalidate(user_uid)
+    elif not broadcast:
+        # the tap was written by another process, our cached state is outdated
+        settings["employee_cache"].invalidate(user_uid)
+    settings["fragment_cache"].invalidate("list_employees")
+    settings["fragment_cache"].invalidate("info", user_uid)
+    if event == "employee" and settings.get("presence") is not None:
+        settings["presence"].publish_refresh()
+    if broadcast and settings.get("broadcast") is not None:
+        settings["broadcast"].send({"event": event, "uid": user_uid})
 
 
 class BaseRequestHandler(tornado.web.RequestHandler):
+    # handlers of all sites together don't get a site and a session
+    SITE_SPECIFIC = True
+
     async def prepare(self):
+        self.request_stats = RequestStats()
+        current_request.set(self.request_stats)
+        self.site_prefix = getattr(self.request, "site_prefix", "")
+        if not self.SITE_SPECIFIC:
+            self.site = self.sqla_session = None
+            return
+        # set by Application.find_handler, None for unknown sites
+        site_id = getattr(self.request, "site_id", DEFAULT_SITE)
+        if site_id is None:
+            raise tornado.web.HTTPError(404)
+        self.site = await self.application.settings["sites"].acquire(site_id)
         self.sqla_session = self.generate_sqla_session()
+        self.metrics.inc("sessions_opened_total")
+
+    @property
+    def metrics(self) -> Metrics:
+        return self.application.settings["metrics"]
 
     def on_finish(self):
         """
         Since Tornado on_finish is not async by default,
         we run the on_finish_async inside the tornado loop.
         """
+        handler = type(self).__name__
+        self.metrics.observe(
+            "http_request_duration_seconds", self.request.request_time(), handler=handler
+        )
+        stats = getattr(self, "request_stats", None)
+        if stats is not None:
+            self.metrics.inc("http_request_db_queries_total", stats.queries, handler=handler)
+            self.metrics.inc("http_request_db_seconds_total", stats.query_time, handler=handler)
         io_loop = tornado.ioloop.IOLoop.current()
         io_loop.add_callback(self.on_finish_async)
 
@@ -30,11 +91,22 @@ class BaseRequestHandler(tornado.web.RequestHandler):
         try:
             if self.sqla_session:
                 await self.sqla_session.close()
+                self.metrics.inc("sessions_closed_total")
         except AttributeError:
             return True
+        finally:
+            site = getattr(self, "site", None)
+            if site is not None:
+                self.site = None
+                self.application.settings["sites"].release(site)
 
     def generate_sqla_session(self):
-        return self.application.settings["sqla"]()
+        return self.site.sqla()
+
+    def get_template_namespace(self):
+        namespace = super().get_template_namespace()
+        namespace["site_prefix"] = self.site_prefix
+        return namespace
 
     def data_received(self, chunk: bytes) -> Optional[Awaitable[None]]:
         return super().data_received(chunk)
@@ -51,72 +123,141 @@ class ListEmployeesRequest(BaseRequestHandler):
     SUPPORTED_METHODS = ["GET"]
 
     async def get(self):
-        result = await self.sqla_session.execute(
-            select(Employee).filter(Employee.active == True)
-        )
-        employees = [row["Employee"] for row in result.fetchall()]
-        await self.render("list_employees.html", employees=employees)
-
-
-async def database_stuff(user_uid, session):
-    result = await session.execute(select(Employee).filter(Employee.uid == user_uid))
-    employee = result.scalars().first()
+        fragments = self.site.settings["fragment_cache"]
+        # the links of the fragment depend on how the site was addressed
+        body = fragments.get("list_employees", self.site_prefix)
+        if body is None:
+            result = await self.sqla_session.execute(
+                select(*EmployeeRow.columns()).filter(Employee.active == True)
+            )
+            employees = [EmployeeRow._make(row) for row in result]
+            body = self.render_string("list_employees.html", employees=employees)
+            fragments.set("list_employees", self.site_prefix, body)
+        # tornado answers with 304 Not Modified if the ETag still matches
+        self.write(body)
+
+
+class OutOfOrderTap(Exception):
+    """A replayed tap older than the check-in of the open entry of its day."""
+
+
+async def database_stuff(
+    user_uid,
+    session,
+    hub=None,
+    cache=None,
+    writer=None,
+    tapped_at=None,
+    idempotency_key=None,
+    registry=None,
+    presence=None,
+):
+    """
+    Check the employee in or out, or confirm a pending web login.
+
+    Readers replaying spooled taps pass the original `tapped_at` and an
+    `idempotency_key`, taps which were already processed return False.
+    Raises OutOfOrderTap for a tap older than the employee's open entry,
+    which it can't close.
+    """
+    if cache is None:
+        cache = EmployeeStateCache()
+    if registry is None:
+        registry = PendingAuthRegistry()
+    today = date.today()
+    # live taps belong to today, replayed ones to the day they happened
+    work_day = today if tapped_at is None else tapped_at.date()
+    employee = await cache.get(session, user_uid, work_day)
 
     if employee is not None:
-        result = await session.execute(
-            select(RCAuthentication)
-            .filter(
-                and_(
-                    RCAuthentication.uid == user_uid,
-                    RCAuthentication.authenticated_at == None,
-                    RCAuthentication.deleted == False,
-                )
+        if idempotency_key is not None:
+            result = await session.execute(
+                statements.card_event_exists, {"idempotency_key": idempotency_key}
             )
-            .order_by(RCAuthentication.requested_at.desc())
-        )
-        auth = result.scalars().first()
-        if auth is not None:
-            if not auth.out_of_time:
-                if (
-                    datetime.datetime.utcnow() - auth.requested_at
-                ).total_seconds() > 600:
-                    auth.success = False
-                else:
-                    auth.authenticated_at = datetime.datetime.utcnow()
-                    auth.success = True
-                await session.commit()
+            if result.first() is not None:
+                return False
+
+        now = datetime.datetime.utcnow()
+        tapped_at = tapped_at or now
+        # a replayed tap is too old to confirm a web login
+        if (now - tapped_at).total_seconds() <= AUTH_TIMEOUT:
+            auth = registry.match(user_uid, now)
+            if auth is not None:
+                await session.execute(
+                    statements.insert_authentication,
+                    {
+                        "uuid": auth.auth_id,
+                        "uid": auth.uid,
+                        "requested_at": auth.requested_at,
+                        "authenticated_at": auth.authenticated_at,
+                        "success": True,
+                        "deleted": False,
+                    },
+                )
+                # in the same commit, a retry of the tap must not check in
+                await record_card_event(session, idempotency_key, employee.id, tapped_at)
+                try:
+                    await session.commit()
+                except IntegrityError:
+                    # a sibling process confirmed the same login, or processed the
+                    # same tap, at the same time
+                    await session.rollback()
+                if hub is not None:
+                    hub.publish(auth.auth_id, auth.uid)
                 return
 
-        result = await session.execute(
-            select(TimeClock)
-            .join(Employee)
-            .filter(
-                and_(
-                    Employee.uid == user_uid,
-                    func.DATE(TimeClock.check_in) == date.today(),
-                    TimeClock.check_out == None,
-                )
+        if employee.out_of_order(tapped_at):
+            raise OutOfOrderTap(user_uid, tapped_at)
+        if not employee.closed_by(tapped_at):
+            event = CheckIn(
+                time_clock_uuid=uuid_str(),
+                employee_id=employee.id,
+                check_in=tapped_at,
+                idempotency_key=idempotency_key,
+                current=work_day == today,
             )
-            .order_by(TimeClock.check_in.desc())
-        )
-        time_clock = result.scalars().first()
-        if time_clock is None:
-            tc = TimeClock(check_in=datetime.datetime.utcnow(), employee_id=employee.id)
-            session.add_all(
-                [
-                    tc,
-                ]
+        else:
+            event = CheckOut(
+                time_clock_uuid=employee.open_time_clock_uuid,
+                employee_id=employee.id,
+                check_in=employee.open_check_in,
+                check_out=tapped_at,
+                total=hours_between(employee.open_check_in, tapped_at),
+                idempotency_key=idempotency_key,
+                current=work_day == today,
             )
-            employee.checked_in = True
-            await session.commit()
+        if work_day != today:
+            # only today's state is cached, a tap of an earlier day doesn't change it
+            cache.invalidate(user_uid)
+        elif isinstance(event, CheckIn):
+            cache.checked_in(user_uid, event.time_clock_uuid, event.check_in)
         else:
-            time_clock.check_out = datetime.datetime.utcnow()
-            time_clock.calculate_total_time()
-            employee.checked_in = False
-            await session.commit()
+            cache.checked_out(user_uid)
+
+        try:
+            if writer is not None:
+                await writer.submit(event)
+            else:
+                await event.apply(session)
+                await session.commit()
+        except Exception:
+            cache.invalidate(user_uid)
+            raise
+        if event.replaced_by is not None:
+            # the cached state was outdated, the writer resolved the tap again
+            event = event.replaced_by
+            cache.invalidate(user_uid)
+        if presence is not None and event.current:
+            presence.publish(user_uid, isinstance(event, CheckIn))
     return True
 
 
+async def authenticated_uid(session, auth_id) -> Optional[str]:
+    """Authenticated logins are kept in the database after they expired in memory."""
+    result = await session.execute(statements.authenticated_uid, {"auth_id": auth_id})
+    return result.scalar()
+
+
 class CreateAuthRequest(BaseRequestHandler):
     SUPPORTED_METHODS = ("GET", "POST")
 
@@ -124,27 +265,18 @@ class CreateAuthRequest(BaseRequestHandler):
         await self.render("authenticate.html", user_uid=user_uid)
 
     async def post(self, user_uid):
-        tc = RCAuthentication(uid=user_uid)
-        self.sqla_session.add_all(
-            [
-                tc,
-            ]
-        )
-        await self.sqla_session.commit()
-
-        counter = 0
-        progress_bar = (
-            f'<div id="pb" class="progress-bar progress-bar-striped" '
-            f'style="width: {counter}%" '
-            f'aria-valuenow="{counter}" aria-valuemin="0" aria-valuemax="60">'
-            f"</div>"
-        )
+        self.metrics.inc("auth_attempts_total")
+        auth = self.site.settings["auth_registry"].create(user_uid)
+
+        if self.application.settings.get("auth_long_poll"):
+            await self.render("waiting_auth.html", auth_request_id=auth.auth_id)
+            return
 
         await self.render(
             "proving_auth.html",
-            auth_request_id=tc.id,
-            counter=counter,
-            progress_bar=progress_bar,
+            auth_request_id=auth.auth_id,
+            counter=0,
+            progress_bar=PROGRESS_BARS[0],
         )
 
 
@@ -152,128 +284,533 @@ class ValidateAuthRequest(BaseRequestHandler):
     SUPPORTED_METHODS = ("GET",)
 
     async def get(self, auth_id, counter):
-        result = await self.sqla_session.execute(
-            select(RCAuthentication).filter(
-                and_(
-                    RCAuthentication.id == auth_id,
-                    RCAuthentication.authenticated_at != None,
-                )
-            )
-        )
-        auth = result.scalars().first()
-
-        if auth is not None:
-            self.redirect(f"/info/{auth.uid}")
-        elif int(counter) == 60:
-            result = await self.sqla_session.execute(
-                select(RCAuthentication).filter(RCAuthentication.id == auth_id)
-            )
-            auth = result.scalars().first()
-            auth.deleted = True
-            await self.sqla_session.commit()
+        registry = self.site.settings["auth_registry"]
+        auth = registry.get(auth_id)
+
+        user_uid = None
+        if auth is None:
+            user_uid = await authenticated_uid(self.sqla_session, auth_id)
+        elif auth.authenticated_at is not None:
+            user_uid = auth.uid
+
+        if user_uid is not None:
+            self.redirect(f"{self.site_prefix}/info/{user_uid}")
+        elif auth is None or int(counter) >= PROGRESS_STEPS:
+            if auth is not None:
+                # the page gave up before the login expired, the next tap is a tap again
+                registry.discard(auth_id)
+            self.metrics.inc("auth_timeouts_total")
             self.write("<h2>Authentication failed.</h2>")
         else:
-            percentage = int(int(counter) * 1.6)
-            progress_bar = (
-                f'<div id="pb" class="progress-bar progress-bar-striped" '
-                f'style="width: {percentage}%" '
-                f'aria-valuenow="{counter}" aria-valuemin="0" aria-valuemax="60">'
-                f"</div>"
-            )
-
             await self.render(
                 "proving_auth.html",
                 auth_request_id=auth_id,
                 counter=int(counter) + 1,
-                progress_bar=progress_bar,
+                progress_bar=PROGRESS_BARS[int(counter)],
             )
 
 
+class WaitAuthRequest(BaseRequestHandler):
+    """
+    Long-poll variant of ValidateAuthRequest.
+
+    Holds the request open until the card tap arrives or the
+    authentication runs out of time, so no polling is required.
+    """
+
+    SUPPORTED_METHODS = ("GET",)
+
+    async def get(self, auth_id):
+        registry = self.site.settings["auth_registry"]
+        auth = registry.get(auth_id)
+        if auth is None:
+            user_uid = await authenticated_uid(self.sqla_session, auth_id)
+            if user_uid is None:
+                self.send_error(status_code=404)
+            else:
+                self.redirect(f"{self.site_prefix}/info/{user_uid}")
+            return
+
+        if auth.authenticated_at is None:
+            remaining = auth.remaining(datetime.datetime.utcnow())
+            user_uid = await self.site.settings["auth_hub"].wait(auth_id, remaining)
+            if user_uid is not None:
+                self.redirect(f"{self.site_prefix}/info/{user_uid}")
+                return
+
+        if auth.authenticated_at is not None:
+            self.redirect(f"{self.site_prefix}/info/{auth.uid}")
+        else:
+            self.metrics.inc("auth_timeouts_total")
+            self.write("<h2>Authentication failed.</h2>")
+
+
 class NewEntry(BaseRequestHandler):
-    """Only allow POST requests."""
+    """
+    Only allow POST requests.
+
+    Readers replaying taps from their spool send the original `timestamp`
+    (UTC seconds since the epoch) and an `idempotency_key`, already
+    processed taps are answered with 200 instead of 202, taps older than
+    the open entry with 409.
+    """
 
     SUPPORTED_METHODS = ("POST",)
+    # tolerated clock skew of the readers
+    MAX_FUTURE_SECONDS = 300
 
     async def post(self, user_uid):
-        await database_stuff(user_uid, self.sqla_session)
+        tapped_at = None
+        timestamp = self.get_argument("timestamp", None)
+        if timestamp is not None:
+            try:
+                tapped_at = datetime.datetime.utcfromtimestamp(float(timestamp))
+            except (ValueError, OverflowError, OSError):
+                self.send_error(status_code=400)
+                return
+            if (tapped_at - datetime.datetime.utcnow()).total_seconds() > self.MAX_FUTURE_SECONDS:
+                self.send_error(status_code=400)
+                return
+
+        try:
+            processed = await database_stuff(
+                user_uid,
+                self.sqla_session,
+                self.site.settings.get("auth_hub"),
+                self.site.settings.get("employee_cache"),
+                self.site.settings.get("writer"),
+                tapped_at=tapped_at,
+                idempotency_key=self.get_argument("idempotency_key", None),
+                registry=self.site.settings.get("auth_registry"),
+                presence=self.site.settings.get("presence"),
+            )
+        except OutOfOrderTap:
+            self.metrics.inc("taps_total", source="single", result="rejected")
+            self.send_error(status_code=409)
+            return
+        if processed is False:
+            self.metrics.inc("taps_total", source="single", result="duplicate")
+            self.set_status(status_code=200)
+            return
+        self.metrics.inc("taps_total", source="single", result="accepted")
+        invalidate_caches(self.site.settings, "tap", user_uid)
         self.set_status(status_code=202)
 
 
+class BatchEntry(BaseRequestHandler):
+    """
+    Only allow POST requests.
+
+    Bulk variant of NewEntry for readers which were offline and for imports,
+    the body is a JSON array or NDJSON of {uid, timestamp, idempotency_key}.
+    """
+
+    SUPPORTED_METHODS = ("POST",)
+
+    async def post(self):
+        try:
+            taps = parse_taps(self.request.body)
+        except ValueError:
+            self.send_error(status_code=400)
+            return
+
+        batch = TapBatch(taps)
+        try:
+            await self.site.settings["writer"].submit(batch)
+        except (IntegrityError, ConcurrentCheckOut):
+            # a concurrent request processed some of the same idempotency keys,
+            # or another process closed one of the open entries
+            self.send_error(status_code=409)
+            return
+
+        stats = batch.stats
+        for result in ("accepted", "duplicates", "unknown", "rejected"):
+            self.metrics.inc("taps_total", stats[result], source="batch", result=result)
+        cache = self.site.settings["employee_cache"]
+        presence = self.site.settings.get("presence")
+        for user_uid, checked_in in stats.pop("uids").items():
+            # unlike live taps the batch didn't update the cached state
+            cache.invalidate(user_uid)
+            invalidate_caches(self.site.settings, "tap", user_uid)
+            if presence is not None and checked_in is not None:
+                presence.publish(user_uid, checked_in)
+        self.write(json.dumps(stats))
+
+
 class ListTimes(BaseRequestHandler):
-    """Only allow GET requests."""
+    """
+    Only allow GET requests.
+
+    Optional query arguments:
+    - from/to: only entries checked in between these dates (YYYY-MM-DD, inclusive)
+    - limit/cursor: keyset pagination, the cursor of the next page is
+      returned in the X-Next-Cursor header
+    - stream: write the JSON array in chunks instead of building it in memory
+    - archive: include the entries moved into the archive tables
+    """
 
     SUPPORTED_METHODS = ("GET",)
+    STREAM_CHUNK_SIZE = 500
 
     async def get(self, user_uid):
-        result = await self.sqla_session.execute(
-            select(TimeClock)
-            .join(Employee)
+        time_clock = TimeClock
+        if self.get_argument("archive", None):
+            # the maintenance and export modules are imported on use, for a short startup
+            from src.maintenance import archive_years, time_clock_with_archive
+
+            years = await self.sqla_session.run_sync(
+                lambda session: archive_years(session.connection())
+            )
+            time_clock = time_clock_with_archive(years)
+        try:
+            query = self.build_query(user_uid, time_clock)
+            limit = self.get_argument("limit", None)
+            limit = int(limit) if limit is not None else None
+            if limit is not None and limit < 1:
+                raise ValueError(limit)
+        except ValueError:
+            self.send_error(status_code=400)
+            return
+
+        if limit is not None:
+            result = await self.sqla_session.execute(query.limit(limit + 1))
+            rows = result.fetchall()
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                self.set_header("X-Next-Cursor", f"{last.check_in.isoformat()}|{last.id}")
+            self.write(TimeClockRow.json_array(rows))
+        elif self.get_argument("stream", None):
+            await self.write_stream(query)
+        else:
+            result = await self.sqla_session.execute(query)
+            self.write(TimeClockRow.json_array(result))
+
+    def build_query(self, user_uid, time_clock=TimeClock):
+        query = (
+            select(*TimeClockRow.columns(time_clock))
+            .join(Employee, Employee.id == time_clock.employee_id)
             .filter(Employee.uid == user_uid)
-            .order_by(TimeClock.check_in.desc())
+            .order_by(time_clock.check_in.desc(), time_clock.id.desc())
         )
-        entities = result.fetchall()
-        data = [entity["TimeClock"].to_dict() for entity in entities]
-        self.write(json.dumps(data))
+        date_from = self.get_argument("from", None)
+        if date_from is not None:
+            query = query.filter(time_clock.check_in >= parse_day(date_from))
+        date_to = self.get_argument("to", None)
+        if date_to is not None:
+            query = query.filter(
+                time_clock.check_in < parse_day(date_to) + datetime.timedelta(days=1)
+            )
+        cursor = self.get_argument("cursor", None)
+        if cursor is not None:
+            check_in, _, time_clock_id = cursor.partition("|")
+            check_in = datetime.datetime.fromisoformat(check_in)
+            time_clock_id = int(time_clock_id)
+            query = query.filter(
+                or_(
+                    time_clock.check_in < check_in,
+                    and_(time_clock.check_in == check_in, time_clock.id < time_clock_id),
+                )
+            )
+        return query
+
+    async def write_stream(self, query):
+        result = await self.sqla_session.stream(
+            query.execution_options(yield_per=self.STREAM_CHUNK_SIZE)
+        )
+        separator = b"["
+        async for partition in result.partitions(self.STREAM_CHUNK_SIZE):
+            # the encoded list without its brackets
+            self.write(separator + TimeClockRow.json_array(partition)[1:-1])
+            separator = b","
+            await self.flush()
+        self.write(b"[]" if separator == b"[" else b"]")
 
 
 class InfoCurrentWorkingTime(BaseRequestHandler):
-    """Only allow GET requests."""
+    """
+    Only allow GET requests.
+
+    Shows today's entries, or every day between the optional
+    from/to dates (YYYY-MM-DD, inclusive).
+    """
 
     SUPPORTED_METHODS = ("GET",)
+    # the total of an open entry is shown with minute precision
+    RUNNING_TOTAL_TTL = 60
 
     async def get(self, user_uid):
-        result = await self.sqla_session.execute(
-            select(Employee).filter(Employee.uid == user_uid)
-        )
-        employee = result.scalars().first()
-        if employee is not None:
-            break_ = []
-            total_time = 0
-            result = await self.sqla_session.execute(
-                select(TimeClock)
-                .join(Employee)
-                .filter(
-                    and_(
-                        Employee.uid == user_uid,
-                        func.DATE(TimeClock.check_in) == date.today(),
-                    )
-                )
-                .order_by(TimeClock.check_in.asc())
-            )
-            data = result.fetchall()
-            return_data = {"starting_time": "-", "breaks": [], "overall_total": "-"}
-            if data:
-                breaks = []
-                for idx, _ in enumerate(data):
-                    row = data[idx]
-                    if row["TimeClock"].check_out is not None:
-                        breaks.append({"start": row["TimeClock"].check_out})
-                    if idx > 0:
-                        selected_element = breaks[idx - 1]
-                        selected_element["end"] = row["TimeClock"].check_in
-                        selected_element["total"] = working_time_repr(
-                            (
-                                selected_element["end"] - selected_element["start"]
-                            ).total_seconds()
-                            / HOUR
-                        )
-
-                for row in data:
-                    tt = row["TimeClock"].total
-                    if tt is not None:
-                        total_time += tt
-                    else:
-                        total_time += (
-                            datetime.datetime.utcnow() - row["TimeClock"].check_in
-                        ).total_seconds() / HOUR
-                return_data = {
-                    "starting_time": data[0]["TimeClock"].check_in,
-                    "breaks": breaks,
-                    "overall_total": working_time_repr(total_time),
-                }
-            await self.render("info.html", **return_data)
-        else:
+        date_from = self.get_argument("from", None)
+        date_to = self.get_argument("to", None)
+        if date_from is not None or date_to is not None:
+            await self.get_range(user_uid, date_from, date_to)
+            return
+
+        fragments = self.site.settings["fragment_cache"]
+        body = fragments.get("info", user_uid)
+        if body is not None:
+            self.write(body)
+            return
+
+        today = date.today()
+        days = await working_time(self.sqla_session, user_uid, today, today)
+        if days is None:
             self.send_error(status_code=404)
+            return
+
+        # the page only shows today's entries
+        midnight = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time())
+        ttl = (midnight - datetime.datetime.now()).total_seconds()
+        return_data = {"starting_time": "-", "breaks": [], "overall_total": "-"}
+        if days:
+            day = days[0]
+            if day["running"]:
+                ttl = min(ttl, self.RUNNING_TOTAL_TTL)
+            return_data = {
+                "starting_time": day["starting_time"],
+                "breaks": day["breaks"],
+                "overall_total": day["overall_total"],
+            }
+        body = self.render_string("info.html", **return_data)
+        fragments.set("info", user_uid, body, ttl=ttl)
+        self.write(body)
+
+    async def get_range(self, user_uid, date_from, date_to):
+        try:
+            date_to = parse_day(date_to).date() if date_to is not None else date.today()
+            date_from = parse_day(date_from).date() if date_from is not None else date_to
+        except ValueError:
+            self.send_error(status_code=400)
+            return
+        if date_from > date_to:
+            self.send_error(status_code=400)
+            return
+
+        days = await working_time(self.sqla_session, user_uid, date_from, date_to)
+        if days is None:
+            self.send_error(status_code=404)
+            return
+        await self.render("info_range.html", days=days)
+
+
+class WorkingTimeReport(BaseRequestHandler):
+    """
+    Only allow GET requests.
+
+    Sums the daily rollups of an employee per day, week or month,
+    optionally limited to a from/to date range (YYYY-MM-DD, inclusive).
+    """
+
+    SUPPORTED_METHODS = ("GET",)
+    PERIODS = {
+        "day": lambda day: day.isoformat(),
+        "week": lambda day: "{0}-W{1:02d}".format(*day.isocalendar()),
+        "month": lambda day: day.strftime("%Y-%m"),
+    }
+
+    async def get(self, user_uid):
+        period = self.PERIODS.get(self.get_argument("granularity", "day"))
+        query = (
+            select(*DailyWorkingTimeRow.columns())
+            .join(Employee)
+            .filter(Employee.uid == user_uid)
+            .order_by(DailyWorkingTime.work_date.asc())
+        )
+        try:
+            date_from = self.get_argument("from", None)
+            if date_from is not None:
+                query = query.filter(DailyWorkingTime.work_date >= parse_day(date_from).date())
+            date_to = self.get_argument("to", None)
+            if date_to is not None:
+                query = query.filter(DailyWorkingTime.work_date <= parse_day(date_to).date())
+        except ValueError:
+            period = None
+        if period is None:
+            self.send_error(status_code=400)
+            return
+
+        result = await self.sqla_session.execute(query)
+        report = {}
+        for daily in map(DailyWorkingTimeRow._make, result):
+            key = period(daily.work_date)
+            if key not in report:
+                report[key] = WorkingTimePeriod(key, daily.first_check_in)
+            report[key].add(daily)
+        self.write(json.dumps([entry.to_dict() for entry in report.values()]))
+
+
+async def worked_by_employee(session, date_from: date, date_to: date):
+    """Days with entries and hours worked per employee between two dates."""
+    result = await session.execute(
+        select(
+            Employee.uid,
+            Employee.name,
+            func.count(DailyWorkingTime.work_date).label("days"),
+            func.sum(DailyWorkingTime.worked).label("worked"),
+        )
+        .join(DailyWorkingTime, DailyWorkingTime.employee_id == Employee.id)
+        .filter(DailyWorkingTime.work_date.between(date_from, date_to))
+        .group_by(Employee.id, Employee.uid, Employee.name)
+        .order_by(Employee.uid)
+    )
+    return result.fetchall()
+
+
+class SitesReport(BaseRequestHandler):
+    """
+    Only allow GET requests.
+
+    Hours worked per employee of all sites between from/to (YYYY-MM-DD,
+    inclusive, the current month by default). The site databases are
+    queried concurrently.
+    """
+
+    SUPPORTED_METHODS = ("GET",)
+    SITE_SPECIFIC = False
+
+    async def get(self, verfication_str):
+        if verfication_str != os.getenv("SECRET"):
+            self.send_error(403)
+            return
+
+        from src.export import month_range
+
+        default_from, default_to = month_range()
+        try:
+            date_from = parse_day(self.get_argument("from", default_from.isoformat())).date()
+            date_to = parse_day(self.get_argument("to", default_to.isoformat())).date()
+        except ValueError:
+            self.send_error(status_code=400)
+            return
+
+        results = await self.application.settings["sites"].gather(
+            lambda session: worked_by_employee(session, date_from, date_to)
+        )
+        data = [
+            {
+                "site": site_id,
+                "uid": row.uid,
+                "name": row.name,
+                "days": row.days,
+                "worked": working_time_repr(row.worked),
+            }
+            for site_id, rows in results.items()
+            for row in rows
+        ]
+        self.write(json.dumps(data))
+
+
+class PayrollExport(BaseRequestHandler):
+    """
+    Only allow GET requests.
+
+    CSV export of worked hours, overtime and breaks of all employees
+    between from/to (YYYY-MM-DD, inclusive, default: current month).
+    """
+
+    SUPPORTED_METHODS = ("GET",)
+
+    async def get(self, verfication_str):
+        if verfication_str != os.getenv("SECRET"):
+            self.send_error(403)
+            return
+
+        from src.export import export_payroll, month_range
+
+        default_from, default_to = month_range()
+        try:
+            date_from = parse_day(self.get_argument("from", default_from.isoformat())).date()
+            date_to = parse_day(self.get_argument("to", default_to.isoformat())).date()
+            daily_hours = float(self.get_argument("daily_hours", 8.0))
+        except ValueError:
+            self.send_error(status_code=400)
+            return
+
+        output = io.StringIO()
+        await export_payroll(self.sqla_session, output, date_from, date_to, daily_hours)
+        self.set_header("Content-Type", "text/csv; charset=UTF-8")
+        self.set_header(
+            "Content-Disposition", f'attachment; filename="payroll_{date_from}_{date_to}.csv"'
+        )
+        self.write(output.getvalue())
+
+
+class PresenceStream(BaseRequestHandler):
+    """
+    Server-sent events of who is checked in, for the boards.
+
+    Sends a `snapshot` of all employees on connect, then `presence`
+    events per changed employee and `employees` when the list of
+    employees changed. A comment line keeps idle connections open.
+    """
+
+    SUPPORTED_METHODS = ("GET",)
+    KEEPALIVE_SECONDS = 30
+
+    async def get(self):
+        presence = self.site.settings["presence"]
+        self.subscriber = presence.subscribe()
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        # don't let nginx buffer the stream
+        self.set_header("X-Accel-Buffering", "no")
+        try:
+            self.write_event("snapshot", presence.snapshot())
+            await self.flush()
+            while True:
+                await self.subscriber.wait(self.KEEPALIVE_SECONDS)
+                if self.subscriber.closed:
+                    break
+                self.write_pending(presence)
+                await self.flush()
+        except StreamClosedError:
+            pass
+        finally:
+            presence.unsubscribe(self.subscriber)
+
+    def write_pending(self, presence):
+        subscriber = self.subscriber
+        if subscriber.refresh:
+            subscriber.refresh = False
+            self.write_event("employees", {})
+        elif not (subscriber.resync or subscriber.pending):
+            self.write(": keepalive\n\n")
+        if subscriber.resync:
+            subscriber.resync = False
+            subscriber.pending.clear()
+            self.write_event("snapshot", presence.snapshot())
+        elif subscriber.pending:
+            pending, subscriber.pending = subscriber.pending, {}
+            for user_uid, checked_in in pending.items():
+                self.write_event("presence", {"uid": user_uid, "checked_in": checked_in})
+
+    def write_event(self, event, data):
+        self.write(f"event: {event}\ndata: {json.dumps(data)}\n\n")
+
+    def on_connection_close(self):
+        subscriber = getattr(self, "subscriber", None)
+        if subscriber is not None:
+            subscriber.close()
+
+
+class CacheStats(BaseRequestHandler):
+    """Hit and miss counters of the fragment cache."""
+
+    SUPPORTED_METHODS = ("GET",)
+
+    async def get(self):
+        self.write(json.dumps(self.site.settings["fragment_cache"].stats()))
+
+
+class MetricsHandler(BaseRequestHandler):
+    """Counters and histograms in the Prometheus text format."""
+
+    SUPPORTED_METHODS = ("GET",)
+    SITE_SPECIFIC = False
+
+    async def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(self.metrics.render())
 
 
 class CreateNewEmployeeRequest(BaseRequestHandler):
@@ -291,6 +828,7 @@ class CreateNewEmployeeRequest(BaseRequestHandler):
                 ]
             )
             await self.sqla_session.commit()
+            invalidate_caches(self.site.settings, "employee", user_id)
             self.set_status(201)
         else:
             self.send_error(403)
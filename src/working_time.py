@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import Date, DateTime, and_, bindparam, case, func, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import Float
+
+from src.models import Employee, TimeClock
+from src.utils import working_time_repr
+
+
+class hours_between(FunctionElement):
+    """Hours from the second to the first datetime argument."""
+
+    type = Float()
+    name = "hours_between"
+    inherit_cache = True
+
+
+@compiles(hours_between)
+def compile_hours_between(element, compiler, **kw):
+    end, start = list(element.clauses)
+    return (
+        f"EXTRACT(EPOCH FROM ({compiler.process(end, **kw)} - {compiler.process(start, **kw)}))"
+        " / 3600"
+    )
+
+
+@compiles(hours_between, "sqlite")
+def compile_hours_between_sqlite(element, compiler, **kw):
+    end, start = list(element.clauses)
+    return (
+        f"(julianday({compiler.process(end, **kw)}) - julianday({compiler.process(start, **kw)}))"
+        " * 24"
+    )
+
+
+class end_of_day(FunctionElement):
+    """Midnight after the date argument."""
+
+    type = DateTime()
+    name = "end_of_day"
+    inherit_cache = True
+
+
+@compiles(end_of_day)
+def compile_end_of_day(element, compiler, **kw):
+    (day,) = list(element.clauses)
+    return f"({compiler.process(day, **kw)} + INTERVAL '1 day')"
+
+
+@compiles(end_of_day, "sqlite")
+def compile_end_of_day_sqlite(element, compiler, **kw):
+    (day,) = list(element.clauses)
+    return f"datetime({compiler.process(day, **kw)}, '+1 day')"
+
+
+def build_working_time_query():
+    """
+    Entries of an employee between two work dates with their breaks and totals.
+
+    The window functions pair every entry with the check_out of the
+    entry before it (the break) and sum the totals per day, open entries
+    count until the `now` parameter or the end of their day, whichever
+    comes first. The employee is outer joined, so a
+    known employee without entries is one row with an empty check_in.
+    """
+    day = dict(partition_by=TimeClock.work_date, order_by=(TimeClock.check_in, TimeClock.id))
+    previous_check_out = func.lag(TimeClock.check_out, type_=DateTime).over(**day)
+    now = bindparam("now", type_=DateTime)
+    day_end = end_of_day(TimeClock.work_date)
+    open_until = case((day_end < now, day_end), else_=now)
+    total = func.coalesce(TimeClock.total, hours_between(open_until, TimeClock.check_in))
+    return (
+        select(
+            TimeClock.work_date,
+            TimeClock.check_in,
+            TimeClock.check_out,
+            previous_check_out.label("break_start"),
+            hours_between(TimeClock.check_in, previous_check_out).label("break_hours"),
+            func.min(TimeClock.check_in)
+            .over(partition_by=TimeClock.work_date)
+            .label("first_check_in"),
+            func.sum(total).over(rows=(None, 0), **day).label("running_total"),
+        )
+        .select_from(Employee)
+        .outerjoin(
+            TimeClock,
+            and_(
+                TimeClock.employee_id == Employee.id,
+                TimeClock.work_date.between(
+                    bindparam("date_from", type_=Date), bindparam("date_to", type_=Date)
+                ),
+            ),
+        )
+        .filter(Employee.uid == bindparam("uid"))
+        .order_by(TimeClock.work_date, TimeClock.check_in, TimeClock.id)
+    )
+
+
+# built once, see src/statements.py
+working_time_query = build_working_time_query()
+
+
+async def working_time(
+    session,
+    user_uid: str,
+    date_from: datetime.date,
+    date_to: datetime.date,
+    now: Optional[datetime.datetime] = None,
+) -> Optional[List[Dict]]:
+    """
+    The info page data of every day with entries, in one round-trip.
+
+    Returns None for unknown employees. `running` tells whether a
+    day has an entry open until now, its total changes every minute.
+    """
+    now = now or datetime.datetime.utcnow()
+    result = await session.execute(
+        working_time_query,
+        {"uid": user_uid, "date_from": date_from, "date_to": date_to, "now": now},
+    )
+    rows = result.fetchall()
+    if not rows:
+        return None
+
+    days = []
+    for row in rows:
+        if row.check_in is None:
+            continue
+        if not days or days[-1]["work_date"] != row.work_date:
+            days.append(
+                {
+                    "work_date": row.work_date,
+                    "starting_time": row.first_check_in,
+                    "breaks": [],
+                    "overall_total": None,
+                    "running": False,
+                }
+            )
+        day = days[-1]
+        if row.break_start is not None:
+            day["breaks"].append(
+                {
+                    "start": row.break_start,
+                    "end": row.check_in,
+                    "total": working_time_repr(row.break_hours),
+                }
+            )
+        day["overall_total"] = working_time_repr(row.running_total)
+        day["running"] = day["running"] or (row.check_out is None and row.work_date == now.date())
+    return days
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import contextvars
+import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+import tornado.util
+from tornado.ioloop import IOLoop
+from tornado.queues import Queue
+
+from src import statements
+from src.ingest import Rollup, Tap, ingest_taps
+from src.models import uuid_str
+from src.shifts import closes, hours_between
+
+
+async def record_card_event(session, idempotency_key, employee_id, tapped_at):
+    if idempotency_key is not None:
+        await session.execute(
+            statements.insert_card_event,
+            {
+                "idempotency_key": idempotency_key,
+                "employee_id": employee_id,
+                "tapped_at": tapped_at,
+                "processed_at": datetime.datetime.utcnow(),
+            },
+        )
+
+
+async def resolve_tap(session, employee_id, tapped_at, idempotency_key, current) -> "Event":
+    """The event of a tap from the open entry in the database instead of the cached one."""
+    result = await session.execute(
+        statements.open_time_clock_of_employee,
+        {"employee_id": employee_id, "work_date": tapped_at.date()},
+    )
+    time_clock = result.first()
+    if time_clock is not None and closes(time_clock.check_in, tapped_at):
+        return CheckOut(
+            time_clock_uuid=time_clock.uuid,
+            employee_id=employee_id,
+            check_in=time_clock.check_in,
+            check_out=tapped_at,
+            total=hours_between(time_clock.check_in, tapped_at),
+            idempotency_key=idempotency_key,
+            current=current,
+        )
+    return CheckIn(
+        time_clock_uuid=uuid_str(),
+        employee_id=employee_id,
+        check_in=tapped_at,
+        idempotency_key=idempotency_key,
+        current=current,
+    )
+
+
+@dataclass
+class CheckIn:
+    time_clock_uuid: str
+    employee_id: int
+    check_in: datetime.datetime
+    idempotency_key: Optional[str] = None
+    # a tap of today, which changes the employee's checked_in flag
+    current: bool = True
+    # the event applied instead, when the cached state the event was built from was outdated
+    replaced_by: Optional["Event"] = field(default=None, repr=False)
+
+    async def apply(self, session):
+        event = await resolve_tap(
+            session, self.employee_id, self.check_in, self.idempotency_key, self.current
+        )
+        if isinstance(event, CheckOut):
+            # another process checked in since the state was cached
+            self.replaced_by = event
+            await event.apply(session)
+            return
+        await record_card_event(session, self.idempotency_key, self.employee_id, self.check_in)
+        await session.execute(
+            statements.insert_time_clock,
+            {
+                "uuid": self.time_clock_uuid,
+                "check_in": self.check_in,
+                "employee_id": self.employee_id,
+                "work_date": self.check_in.date(),
+            },
+        )
+        if self.current:
+            await session.execute(
+                statements.set_checked_in, {"b_id": self.employee_id, "b_checked_in": True}
+            )
+
+
+@dataclass
+class CheckOut:
+    time_clock_uuid: str
+    employee_id: int
+    check_in: datetime.datetime
+    check_out: datetime.datetime
+    total: float
+    idempotency_key: Optional[str] = None
+    current: bool = True
+    replaced_by: Optional["Event"] = field(default=None, repr=False)
+
+    async def apply(self, session):
+        result = await session.execute(
+            statements.check_out_time_clock,
+            {"b_uuid": self.time_clock_uuid, "b_check_out": self.check_out, "b_total": self.total},
+        )
+        if result.rowcount == 0:
+            # the entry was closed since it was cached, by a batch queued before
+            # this tap or by another process
+            self.replaced_by = await resolve_tap(
+                session, self.employee_id, self.check_out, self.idempotency_key, self.current
+            )
+            await self.replaced_by.apply(session)
+            return
+        await record_card_event(session, self.idempotency_key, self.employee_id, self.check_out)
+        if self.current:
+            await session.execute(
+                statements.set_checked_in, {"b_id": self.employee_id, "b_checked_in": False}
+            )
+
+        work_date = self.check_in.date()
+        result = await session.execute(
+            statements.daily_working_time_of_day,
+            {"employee_id": self.employee_id, "work_date": work_date},
+        )
+        row = result.first()
+        daily = Rollup(self.employee_id, work_date) if row is None else Rollup(**row._mapping)
+        daily.add_time_clock(self.check_in, self.check_out, self.total)
+        if row is None:
+            await session.execute(statements.insert_daily_working_time, vars(daily))
+        else:
+            await session.execute(statements.update_daily_working_time, daily.update_params())
+
+
+Event = Union[CheckIn, CheckOut]
+
+
+@dataclass
+class TapBatch:
+    """The taps of `/add/batch`, queued like live taps so both are applied in order."""
+
+    taps: List[Tap]
+    stats: Optional[Dict[str, object]] = None
+
+    async def apply(self, session):
+        self.stats = await ingest_taps(session, self.taps, commit=False)
+
+
+class GroupCommitWriter:
+    """
+    Coalesces check-in/check-out writes into a single transaction.
+
+    Events are collected until either `max_batch` events are queued or
+    the oldest event waited `max_latency` seconds. `submit` returns once
+    the transaction containing the event has been committed.
+    """
+
+    def __init__(self, session_factory, max_latency: float = 0.02, max_batch: int = 200):
+        self.session_factory = session_factory
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+        self._queue: Queue = Queue()
+        self._running = False
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            # not in the context of the submitting request, whose stats would
+            # otherwise count the queries of all later transactions
+            contextvars.Context().run(IOLoop.current().spawn_callback, self._run)
+
+    def stop(self):
+        """End the background task once the queued events are committed."""
+        if self._running:
+            self._running = False
+            self._queue.put_nowait(None)
+
+    async def submit(self, event):
+        self.start()
+        future = asyncio.get_event_loop().create_future()
+        await self._queue.put((event, future))
+        return await future
+
+    async def _run(self):
+        stopped = False
+        while not stopped:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = IOLoop.current().time() + self.max_latency
+            while len(batch) < self.max_batch:
+                try:
+                    item = await self._queue.get(timeout=deadline)
+                except tornado.util.TimeoutError:
+                    break
+                if item is None:
+                    stopped = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[object, asyncio.Future]]):
+        try:
+            await self._commit([event for event, _ in batch])
+        except Exception as exc:
+            if len(batch) == 1:
+                self._resolve(batch, exc)
+                return
+        else:
+            self._resolve(batch)
+            return
+        # retry one by one so a single bad event does not fail its neighbours
+        for item in batch:
+            await self._flush([item])
+
+    async def _commit(self, events):
+        async with self.session_factory() as session:
+            for event in events:
+                await event.apply(session)
+            await session.commit()
+
+    @staticmethod
+    def _resolve(batch, exc: Optional[Exception] = None):
+        for _, future in batch:
+            if future.done():
+                continue
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(True)
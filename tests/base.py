@@ -0,0 +1,121 @@
+"""The application on a temporary SQLite database, for tests over HTTP."""
+
+import asyncio
+import datetime
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select
+from tornado.testing import AsyncHTTPTestCase
+
+from src.database import make_engine
+from src.models import Base, DailyWorkingTime, Employee, TimeClock, uuid_str
+from src.runserver import Application
+from src.sites import DEFAULT_SITE
+
+
+def timestamp(tapped_at: datetime.datetime) -> float:
+    """The seconds since the epoch of a UTC time, as sent by the readers."""
+    return (tapped_at - datetime.datetime(1970, 1, 1)).total_seconds()
+
+
+class AppTestCase(AsyncHTTPTestCase):
+    # pytest creates an instance without a test method, which tornado 6.1 can't wrap
+    runTest = None
+
+    def get_app(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.engine = make_engine(
+            f"sqlite+aiosqlite:///{os.path.join(directory.name, 'test.sqlite3')}"
+        )
+
+        async def create_schema():
+            async with self.engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+
+        self.io_loop.run_sync(create_schema)
+        application = Application(engine=self.engine)
+        self.site = application.sites.get(DEFAULT_SITE)
+        return application
+
+    def tearDown(self):
+        async def close():
+            # the sessions of the requests are closed after their responses were sent
+            while self.site.users:
+                await asyncio.sleep(0.01)
+            await self.site.close()
+
+        self.io_loop.run_sync(close)
+        super().tearDown()
+
+    @property
+    def settings(self):
+        return self.site.settings
+
+    def create_employee(self, uid: str):
+        async def create():
+            async with self.site.sqla() as session:
+                await session.execute(
+                    insert(Employee),
+                    [dict(uuid=uuid_str(), uid=uid, name=uid, active=True, checked_in=False)],
+                )
+                await session.commit()
+
+        self.io_loop.run_sync(create)
+
+    def tap(
+        self,
+        uid: str,
+        tapped_at: Optional[datetime.datetime] = None,
+        idempotency_key: Optional[str] = None,
+    ):
+        arguments = []
+        if tapped_at is not None:
+            arguments.append(f"timestamp={timestamp(tapped_at)}")
+        if idempotency_key is not None:
+            arguments.append(f"idempotency_key={idempotency_key}")
+        query = f"?{'&'.join(arguments)}" if arguments else ""
+        return self.fetch(f"/add/{uid}{query}", method="POST", body="")
+
+    def time_clocks(self, uid: str) -> List:
+        """The entries of the employee, oldest first."""
+
+        async def load():
+            async with self.site.sqla() as session:
+                result = await session.execute(
+                    select(TimeClock.uuid, TimeClock.check_in, TimeClock.check_out, TimeClock.total)
+                    .join(Employee, Employee.id == TimeClock.employee_id)
+                    .filter(Employee.uid == uid)
+                    .order_by(TimeClock.check_in, TimeClock.id)
+                )
+                return result.fetchall()
+
+        return self.io_loop.run_sync(load)
+
+    def worked(self, uid: str) -> Dict:
+        """The hours of the daily rollups of the employee by work date."""
+
+        async def load():
+            async with self.site.sqla() as session:
+                result = await session.execute(
+                    select(DailyWorkingTime.work_date, DailyWorkingTime.worked)
+                    .join(Employee, Employee.id == DailyWorkingTime.employee_id)
+                    .filter(Employee.uid == uid)
+                )
+                return dict(result.fetchall())
+
+        return self.io_loop.run_sync(load)
+
+    def checked_in(self, uid: str) -> bool:
+        """The checked_in flag of the employee in the database."""
+
+        async def load():
+            async with self.site.sqla() as session:
+                result = await session.execute(
+                    select(Employee.checked_in).filter(Employee.uid == uid)
+                )
+                return bool(result.scalar_one())
+
+        return self.io_loop.run_sync(load)
@@ -0,0 +1,107 @@
+import asyncio
+import datetime
+import re
+import unittest
+
+from tornado.httpclient import AsyncHTTPClient
+
+from src.pending_auth import AUTH_TIMEOUT, PendingAuthRegistry
+from src.rendering import PROGRESS_STEPS
+from tests.base import AppTestCase
+
+REQUESTED_AT = datetime.datetime(2021, 3, 1, 8)
+
+
+class Broadcast:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+class PendingAuthRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = PendingAuthRegistry()
+        self.auth = self.registry.create("u1", REQUESTED_AT)
+
+    def test_pending_until_the_timeout(self):
+        timeout = REQUESTED_AT + datetime.timedelta(seconds=AUTH_TIMEOUT)
+        self.assertIs(self.registry.get(self.auth.auth_id, timeout), self.auth)
+        self.assertIsNone(
+            self.registry.get(self.auth.auth_id, timeout + datetime.timedelta(0, 0, 1))
+        )
+        self.assertIsNone(self.registry.match("u1", timeout + datetime.timedelta(0, 0, 1)))
+        self.assertEqual(len(self.registry), 0)
+
+    def test_match_at_the_timeout(self):
+        timeout = REQUESTED_AT + datetime.timedelta(seconds=AUTH_TIMEOUT)
+        self.assertIs(self.registry.match("u1", timeout), self.auth)
+        self.assertEqual(self.auth.authenticated_at, timeout)
+        # the tap confirmed the login, the next one is a check-in
+        self.assertIsNone(self.registry.match("u1", timeout))
+
+    def test_superseded_login(self):
+        later = self.registry.create("u1", REQUESTED_AT + datetime.timedelta(seconds=1))
+        self.assertIs(self.registry.match("u1", later.requested_at), later)
+        self.assertIsNone(self.auth.authenticated_at)
+        self.assertIsNone(self.registry.match("u1", later.requested_at))
+
+    def test_discard(self):
+        self.registry.broadcast = Broadcast()
+        self.registry.discard(self.auth.auth_id)
+        self.assertIsNone(self.registry.get(self.auth.auth_id, REQUESTED_AT))
+        self.assertIsNone(self.registry.match("u1", REQUESTED_AT))
+        self.assertEqual(
+            self.registry.broadcast.messages,
+            [{"event": "auth_discard", "auth_id": self.auth.auth_id}],
+        )
+        # unknown logins and messages of the sibling processes aren't sent again
+        self.registry.discard(self.auth.auth_id)
+        self.registry.discard(self.registry.create("u1", REQUESTED_AT).auth_id, broadcast=False)
+        self.assertEqual(len(self.registry.broadcast.messages), 2)
+
+    def test_discard_superseded_login(self):
+        later = self.registry.create("u1", REQUESTED_AT + datetime.timedelta(seconds=1))
+        self.registry.discard(self.auth.auth_id)
+        self.assertIs(self.registry.match("u1", later.requested_at), later)
+
+    def test_expire_after_discard(self):
+        later = self.registry.create("u2", REQUESTED_AT + datetime.timedelta(seconds=1))
+        self.registry.discard(later.auth_id)
+        self.registry.expire(REQUESTED_AT + datetime.timedelta(seconds=AUTH_TIMEOUT + 1))
+        self.assertEqual(len(self.registry), 0)
+
+
+class AuthRequestTest(AppTestCase):
+    def request_auth(self, uid: str) -> str:
+        response = self.fetch(f"/auth/request/{uid}", method="POST", body="")
+        return re.search(rb"/auth/([0-9a-f-]{36})", response.body).group(1).decode()
+
+    def test_failed_login_is_discarded(self):
+        self.create_employee("u1")
+        auth_id = self.request_auth("u1")
+        response = self.fetch(f"/validate/auth/{auth_id}/{PROGRESS_STEPS}")
+        self.assertIn(b"Authentication failed", response.body)
+
+        self.assertEqual(self.tap("u1").code, 202)
+        self.assertEqual(len(self.time_clocks("u1")), 1)
+        response = self.fetch(f"/validate/auth/{auth_id}/1")
+        self.assertIn(b"Authentication failed", response.body)
+
+    def test_concurrent_taps_of_the_same_card(self):
+        self.create_employee("u1")
+        auth_id = self.request_auth("u1")
+        client = AsyncHTTPClient()
+
+        async def taps():
+            return await asyncio.gather(
+                *(client.fetch(self.get_url("/add/u1"), method="POST", body="") for _ in range(2))
+            )
+
+        self.assertEqual([response.code for response in self.io_loop.run_sync(taps)], [202, 202])
+        # one tap confirmed the login, the other checked in
+        self.assertEqual(len(self.time_clocks("u1")), 1)
+        response = self.fetch(f"/validate/auth/{auth_id}/1", follow_redirects=False)
+        self.assertEqual(response.code, 302)
+        self.assertEqual(response.headers["Location"], "/info/u1")
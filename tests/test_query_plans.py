@@ -0,0 +1,87 @@
+"""
+The per-day and per-employee lookups must be index searches, not scans.
+
+SQLite picks the index from the statistics of `ANALYZE`, which the
+database maintenance refreshes, so the tables are seeded and analyzed
+like a database after a few months of use.
+"""
+import datetime
+import re
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import insert
+
+from src import statements
+from src.database import make_sync_engine
+from src.models import Base, Employee, RCAuthentication, TimeClock
+from src.views import ListTimes
+from src.working_time import working_time_query
+
+
+@pytest.fixture(scope="module")
+def connection():
+    engine = make_sync_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    start = datetime.datetime(2021, 1, 4, 8)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Employee),
+            [dict(uuid=f"e{number}", uid=f"u{number}", name="") for number in range(50)],
+        )
+        connection.execute(
+            insert(TimeClock),
+            [
+                dict(
+                    uuid=f"t{day}-{number}",
+                    check_in=start + datetime.timedelta(days=day),
+                    check_out=start + datetime.timedelta(days=day, hours=8),
+                    total=8.0,
+                    employee_id=number + 1,
+                    work_date=(start + datetime.timedelta(days=day)).date(),
+                )
+                for day in range(200)
+                for number in range(50)
+            ],
+        )
+        connection.execute(
+            insert(RCAuthentication),
+            [dict(uuid=f"a{number}", uid=f"u{number % 50}") for number in range(500)],
+        )
+        connection.exec_driver_sql("ANALYZE")
+    with engine.connect() as connection:
+        yield connection
+    engine.dispose()
+
+
+def query_plan(connection, statement) -> str:
+    """The `EXPLAIN QUERY PLAN` details, the plan doesn't depend on the parameter values."""
+    compiled = statement.compile(dialect=connection.dialect)
+    parameters = (None,) * len(compiled.positiontup)
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", parameters)
+    return "\n".join(row[-1] for row in rows)
+
+
+def list_query():
+    # the query of /list/<uid> without from/to/cursor arguments
+    handler = SimpleNamespace(get_argument=lambda name, default=None: default)
+    return ListTimes.build_query(handler, "u1")
+
+
+@pytest.mark.parametrize(
+    "statement, indexes",
+    [
+        (list_query(), ["idx_employee_uid", "idx_time_clock_employee_check_in"]),
+        (working_time_query, ["idx_employee_uid", "idx_time_clock_employee_work_date"]),
+        (statements.employee_by_uid, ["idx_employee_uid"]),
+        (statements.open_time_clock_of_employee, ["idx_time_clock_employee_work_date"]),
+        (statements.authenticated_uid, ["sqlite_autoindex_rcauthentication_1"]),
+    ],
+    ids=["list", "info", "employee", "tap", "auth"],
+)
+def test_index_is_used(connection, statement, indexes):
+    plan = query_plan(connection, statement)
+    for index in indexes:
+        assert re.search(rf"\bINDEX {index}\b", plan), plan
+    for table in ("timeclock", "employee", "rcauthentication"):
+        assert f"SCAN {table}" not in plan, plan
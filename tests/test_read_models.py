@@ -0,0 +1,21 @@
+import datetime
+import json
+import unittest
+
+from src.read_models import TimeClockRow
+from src.rendering import generate_rows
+
+
+class TimeClockRowTest(unittest.TestCase):
+    def test_json_array_matches_to_dict(self):
+        rows = generate_rows(100)
+        check_in = datetime.datetime(2021, 3, 1, 7, 30, 12, 345678)
+        # an open entry, with microseconds
+        rows.append(("open", check_in, None, None, 2, 101))
+        self.assertEqual(
+            json.loads(TimeClockRow.json_array(rows)),
+            [TimeClockRow._make(row).to_dict() for row in rows],
+        )
+
+    def test_json_array_of_no_rows(self):
+        self.assertEqual(TimeClockRow.json_array([]), b"[]")
@@ -0,0 +1,81 @@
+"""
+`replay_batch` against `replay` on random taps.
+
+The taps are generated in random order over several days, with open
+entries before the batch of the same, earlier and later days, some of
+them checked in after the first tap of their day.
+"""
+
+import datetime
+import math
+import random
+import unittest
+
+from src.shifts import replay, replay_batch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+FIRST_DAY = datetime.datetime(2021, 3, 1)
+DAYS = 4
+EMPLOYEES = 30
+
+
+def random_taps(rng: random.Random):
+    taps = []
+    for employee in range(EMPLOYEES):
+        for _ in range(rng.randint(0, 12)):
+            tapped_at = FIRST_DAY + datetime.timedelta(
+                days=rng.randrange(DAYS), minutes=rng.randrange(24 * 60)
+            )
+            taps.append((employee, tapped_at))
+    # a repeated timestamp checks out after zero hours
+    taps.extend(rng.sample(taps, len(taps) // 10))
+    rng.shuffle(taps)
+    return taps
+
+
+def random_open_entries(rng: random.Random):
+    open_entries = {}
+    for employee in range(EMPLOYEES):
+        if rng.random() < 0.5:
+            open_entries[employee] = FIRST_DAY + datetime.timedelta(
+                days=rng.randrange(-1, DAYS + 1), minutes=rng.randrange(24 * 60)
+            )
+    return open_entries
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class ReplayBatchTest(unittest.TestCase):
+    def test_same_transitions_as_replay(self):
+        for seed in range(50):
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                taps = random_taps(rng)
+                open_entries = random_open_entries(rng)
+                # replay_batch wants the taps grouped by key and ordered by time
+                taps.sort()
+
+                expected_open_entries = dict(open_entries)
+                expected = list(replay(taps, expected_open_entries))
+                batch = replay_batch(
+                    numpy.array([key for key, _ in taps], dtype=numpy.int64),
+                    numpy.array([tapped_at for _, tapped_at in taps], dtype="datetime64[us]"),
+                    open_entries,
+                )
+
+                self.assertEqual(
+                    [transition.is_check_out for transition in expected],
+                    batch.is_check_out.tolist(),
+                )
+                self.assertEqual(
+                    [transition.check_in for transition in expected], batch.check_in.tolist()
+                )
+                for transition, total in zip(expected, batch.total.tolist()):
+                    if transition.total is None:
+                        self.assertTrue(math.isnan(total))
+                    else:
+                        self.assertAlmostEqual(transition.total, total)
+                self.assertEqual(expected_open_entries, open_entries)
@@ -0,0 +1,76 @@
+"""
+The startup of the server, in a fresh interpreter so the modules the
+other tests imported don't hide what the startup imports.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from src.database import make_sync_engine
+from src.models import Base
+
+# the default of `python -m src.startup`
+BUDGET = 3.0
+
+START = """
+import json
+import sys
+
+from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
+from tornado.options import options
+
+from src.runserver import start
+from src.startup import StartupTimer
+
+options.maintenance_interval = 0
+timer = StartupTimer()
+http_server = IOLoop.current().run_sync(
+    lambda: start(bind_sockets(0, "127.0.0.1"), timer=timer)
+)
+http_server.stop()
+json.dump(
+    dict(phases=timer.phases, total=timer.total, modules=sorted(sys.modules)), sys.stderr
+)
+"""
+
+
+class StartupTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, "startup.sqlite3")
+            engine = make_sync_engine(f"sqlite:///{database}")
+            Base.metadata.create_all(engine)
+            engine.dispose()
+            process = subprocess.run(
+                [sys.executable, "-c", START],
+                env=dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{database}"),
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        cls.startup = json.loads(process.stderr.splitlines()[-1])
+
+    def test_phases(self):
+        self.assertEqual(
+            [phase for phase, _ in self.startup["phases"]],
+            [
+                "interpreter and imports",
+                "application",
+                "templates and mappers",
+                "database connection",
+                "caches",
+                "listen",
+            ],
+        )
+        self.assertLess(self.startup["total"], BUDGET)
+
+    def test_imports_on_use(self):
+        self.assertNotIn("numpy", self.startup["modules"])
+        self.assertNotIn("src.maintenance", self.startup["modules"])
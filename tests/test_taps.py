@@ -0,0 +1,149 @@
+import asyncio
+import datetime
+import json
+
+from tornado.httpclient import AsyncHTTPClient
+
+from tests.base import AppTestCase, timestamp
+
+# the precision of the timestamps sent as float seconds
+MILLISECOND = datetime.timedelta(milliseconds=1)
+
+
+class TapTest(AppTestCase):
+    def test_check_in_and_out(self):
+        self.create_employee("u1")
+        self.assertEqual(self.tap("u1").code, 202)
+        self.assertEqual(self.tap("u1").code, 202)
+        self.assertEqual(self.tap("u1").code, 202)
+        entries = self.time_clocks("u1")
+        self.assertEqual(len(entries), 2)
+        self.assertIsNotNone(entries[0].check_out)
+        self.assertIsNone(entries[1].check_out)
+
+    def test_retried_login_tap_is_a_duplicate(self):
+        self.create_employee("u1")
+        self.fetch("/auth/request/u1", method="POST", body="")
+        self.assertEqual(self.tap("u1", idempotency_key="k1").code, 202)
+        self.assertEqual(len(self.settings["auth_registry"]._by_uid), 0)
+        # the reader didn't get the answer and sends the tap again
+        self.assertEqual(self.tap("u1", idempotency_key="k1").code, 200)
+        self.assertEqual(self.time_clocks("u1"), [])
+
+    def test_replayed_check_out_of_an_earlier_day(self):
+        self.create_employee("u1")
+        check_in = datetime.datetime.utcnow().replace(hour=8, microsecond=0)
+        check_in -= datetime.timedelta(days=2)
+        self.assertEqual(self.tap("u1", check_in, "k1").code, 202)
+        self.assertEqual(self.tap("u1").code, 202)
+        # a process which hasn't seen the employee yet
+        self.settings["employee_cache"].invalidate()
+        check_out = check_in + datetime.timedelta(hours=8)
+        self.assertEqual(self.tap("u1", check_out, "k2").code, 202)
+
+        earlier, today = self.time_clocks("u1")
+        self.assertEqual(earlier.check_out, check_out)
+        self.assertAlmostEqual(earlier.total, 8.0)
+        # today's open entry is still open
+        self.assertIsNone(today.check_out)
+        self.assertTrue(self.checked_in("u1"))
+        self.assertTrue(self.settings["presence"].snapshot()["u1"])
+        self.assertEqual(self.tap("u1").code, 202)
+        self.assertIsNotNone(self.time_clocks("u1")[1].check_out)
+        self.assertFalse(self.checked_in("u1"))
+
+    def test_live_tap_after_a_batch(self):
+        self.create_employee("u1")
+        self.assertEqual(self.tap("u1").code, 202)
+        # the reader was offline for the check-out
+        check_out = datetime.datetime.utcnow()
+        taps = [{"uid": "u1", "timestamp": timestamp(check_out), "idempotency_key": "k1"}]
+        response = self.fetch("/add/batch", method="POST", body=json.dumps(taps))
+        self.assertEqual(json.loads(response.body)["accepted"], 1)
+
+        self.assertEqual(self.tap("u1").code, 202)
+        closed, opened = self.time_clocks("u1")
+        self.assertAlmostEqual(closed.check_out, check_out, delta=MILLISECOND)
+        self.assertIsNone(opened.check_out)
+
+    def test_batch_tap_older_than_the_open_entry(self):
+        self.create_employee("u1")
+        yesterday = datetime.datetime.utcnow().date() - datetime.timedelta(days=1)
+        check_in = datetime.datetime.combine(yesterday, datetime.time(12))
+        self.assertEqual(self.tap("u1", check_in, "k1").code, 202)
+        check_out = check_in + datetime.timedelta(hours=4)
+        taps = [
+            {"uid": "u1", "timestamp": timestamp(check_out), "idempotency_key": "k3"},
+            # would close the entry half an hour before it was opened
+            {"uid": "u1", "timestamp": timestamp(check_in) - 1800, "idempotency_key": "k2"},
+        ]
+        response = self.fetch("/add/batch", method="POST", body=json.dumps(taps))
+        self.assertEqual(
+            json.loads(response.body), {"accepted": 1, "duplicates": 0, "unknown": 0, "rejected": 1}
+        )
+        (entry,) = self.time_clocks("u1")
+        self.assertEqual(entry.check_out, check_out)
+        self.assertEqual(self.worked("u1"), {yesterday: 4.0})
+
+    def test_batch_of_an_earlier_day(self):
+        self.create_employee("u1")
+        self.assertEqual(self.tap("u1").code, 202)
+        check_in = datetime.datetime.utcnow().replace(hour=8, microsecond=0)
+        check_in -= datetime.timedelta(days=1)
+        taps = [
+            {"uid": "u1", "timestamp": timestamp(check_in), "idempotency_key": "k1"},
+            {"uid": "u1", "timestamp": timestamp(check_in) + 3600, "idempotency_key": "k2"},
+        ]
+        response = self.fetch("/add/batch", method="POST", body=json.dumps(taps))
+        self.assertEqual(json.loads(response.body)["accepted"], 2)
+        earlier, today = self.time_clocks("u1")
+        self.assertAlmostEqual(earlier.total, 1.0)
+        # still checked in to today's entry
+        self.assertIsNone(today.check_out)
+        self.assertTrue(self.checked_in("u1"))
+        self.assertTrue(self.settings["presence"].snapshot()["u1"])
+
+    def test_live_tap_while_a_batch_is_queued(self):
+        self.create_employee("u1")
+        self.assertEqual(self.tap("u1").code, 202)
+        check_in = self.time_clocks("u1")[0].check_in
+        check_out = datetime.datetime.utcnow()
+        taps = [{"uid": "u1", "timestamp": timestamp(check_out), "idempotency_key": "k1"}]
+        # both are committed in the same group, the live tap after the batch
+        self.settings["writer"].max_latency = 0.5
+        client = AsyncHTTPClient()
+
+        async def batch_and_tap():
+            batch = client.fetch(self.get_url("/add/batch"), method="POST", body=json.dumps(taps))
+            await asyncio.sleep(0.1)
+            tap = client.fetch(self.get_url("/add/u1"), method="POST", body="")
+            return await asyncio.gather(batch, tap)
+
+        self.assertEqual([r.code for r in self.io_loop.run_sync(batch_and_tap)], [200, 202])
+        # the live tap opened an entry instead of closing the one of the batch again
+        closed, opened = self.time_clocks("u1")
+        self.assertAlmostEqual(closed.check_out, check_out, delta=MILLISECOND)
+        self.assertIsNone(opened.check_out)
+        self.assertAlmostEqual(
+            self.worked("u1")[check_in.date()], (check_out - check_in).total_seconds() / 3600
+        )
+        # the cached state was loaded again
+        self.assertEqual(self.tap("u1").code, 202)
+        self.assertIsNotNone(self.time_clocks("u1")[1].check_out)
+
+    def test_replayed_tap_older_than_the_open_entry(self):
+        self.create_employee("u1")
+        yesterday = datetime.datetime.utcnow().date() - datetime.timedelta(days=1)
+        check_in = datetime.datetime.combine(yesterday, datetime.time(12))
+        self.assertEqual(self.tap("u1", check_in, "k1").code, 202)
+        # would close the entry half an hour before it was opened
+        self.assertEqual(self.tap("u1", check_in - datetime.timedelta(minutes=30), "k2").code, 409)
+        (entry,) = self.time_clocks("u1")
+        self.assertIsNone(entry.check_out)
+        self.assertEqual(self.worked("u1"), {})
+
+        check_out = check_in + datetime.timedelta(hours=4)
+        self.assertEqual(self.tap("u1", check_out, "k3").code, 202)
+        (entry,) = self.time_clocks("u1")
+        self.assertEqual(entry.check_out, check_out)
+        self.assertEqual(self.worked("u1"), {yesterday: 4.0})
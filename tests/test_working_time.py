@@ -0,0 +1,114 @@
+"""
+The info page query against the Python loop it replaced, on random entries.
+
+The loop summed the totals of a day with an open entry counting until
+now; as in the query, it counts until midnight for earlier days.
+"""
+
+import datetime
+import random
+
+from sqlalchemy import insert
+
+from src.models import HOUR, TimeClock
+from src.utils import working_time_repr
+from src.working_time import working_time
+from tests.base import AppTestCase
+
+FIRST_DAY = datetime.date(2021, 3, 1)
+DAYS = 31
+
+
+def python_loop(entries, now):
+    breaks = []
+    total_time = 0
+    for idx, entry in enumerate(entries):
+        if entry["check_out"] is not None:
+            breaks.append({"start": entry["check_out"]})
+        if idx > 0:
+            selected_element = breaks[idx - 1]
+            selected_element["end"] = entry["check_in"]
+            selected_element["total"] = working_time_repr(
+                (selected_element["end"] - selected_element["start"]).total_seconds() / HOUR
+            )
+    for entry in entries:
+        if entry["total"] is not None:
+            total_time += entry["total"]
+        else:
+            midnight = datetime.datetime.combine(
+                entry["work_date"] + datetime.timedelta(days=1), datetime.time()
+            )
+            total_time += (min(now, midnight) - entry["check_in"]).total_seconds() / HOUR
+    return {
+        "starting_time": entries[0]["check_in"],
+        # the template skips the break after the last entry
+        "breaks": [element for element in breaks if "total" in element],
+        "overall_total": working_time_repr(total_time),
+    }
+
+
+def random_day(rng: random.Random, day: datetime.date, employee_id: int):
+    entries = []
+    check_in = datetime.datetime.combine(day, datetime.time(6)) + datetime.timedelta(
+        seconds=rng.uniform(0, 3 * 3600)
+    )
+    for number in range(rng.randint(0, 3)):
+        check_out = check_in + datetime.timedelta(seconds=rng.uniform(600, 3 * 3600))
+        entries.append(
+            dict(
+                uuid=f"{employee_id}-{day}-{number}",
+                check_in=check_in,
+                check_out=check_out,
+                total=(check_out - check_in).total_seconds() / HOUR,
+                employee_id=employee_id,
+                work_date=day,
+            )
+        )
+        check_in = check_out + datetime.timedelta(seconds=rng.uniform(60, 45 * 60))
+    if entries and rng.random() < 0.3:
+        entries[-1].update(check_out=None, total=None)
+    return entries
+
+
+class WorkingTimeTest(AppTestCase):
+    def test_query_matches_the_python_loop(self):
+        rng = random.Random(18)
+        last_day = FIRST_DAY + datetime.timedelta(days=DAYS - 1)
+        for employee_id in range(1, 21):
+            uid = f"u{employee_id}"
+            self.create_employee(uid)
+            entries = [
+                entry
+                for number in range(DAYS)
+                for entry in random_day(
+                    rng, FIRST_DAY + datetime.timedelta(days=number), employee_id
+                )
+            ]
+            # after the entries of the last day, which is today
+            now = datetime.datetime.combine(last_day, datetime.time(21)) + datetime.timedelta(
+                seconds=rng.uniform(0, 2 * 3600)
+            )
+            if entries:
+                self.io_loop.run_sync(lambda: self.insert(entries))
+
+            days = self.io_loop.run_sync(lambda: self.working_time(uid, FIRST_DAY, last_day, now))
+            expected = {}
+            for entry in entries:
+                expected.setdefault(entry["work_date"], []).append(entry)
+            self.assertEqual([day["work_date"] for day in days], sorted(expected))
+            for day in days:
+                self.assertEqual(
+                    {key: day[key] for key in ("starting_time", "breaks", "overall_total")},
+                    python_loop(expected[day["work_date"]], now),
+                )
+                open_entry = expected[day["work_date"]][-1]["check_out"] is None
+                self.assertEqual(day["running"], open_entry and day["work_date"] == last_day)
+
+    async def insert(self, entries):
+        async with self.site.sqla() as session:
+            await session.execute(insert(TimeClock), entries)
+            await session.commit()
+
+    async def working_time(self, *args):
+        async with self.site.sqla() as session:
+            return await working_time(session, *args)
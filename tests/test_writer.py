@@ -0,0 +1,57 @@
+import datetime
+
+from src.database import make_engine
+from src.metrics import RequestStats, current_request
+from src.sites import Site
+from src.views import database_stuff
+from src.writer import CheckIn
+from tests.base import AppTestCase
+
+
+class GroupCommitWriterTest(AppTestCase):
+    def test_queries_are_not_counted_to_the_first_request(self):
+        self.create_employee("u1")
+        stats = RequestStats()
+
+        async def submit():
+            current_request.set(stats)
+            await self.settings["writer"].submit(
+                CheckIn("t1", 1, datetime.datetime.utcnow().replace(microsecond=0))
+            )
+
+        self.io_loop.run_sync(submit)
+        self.assertEqual(stats.queries, 0)
+        self.assertEqual(len(self.time_clocks("u1")), 1)
+
+    def test_stale_cache_of_another_process(self):
+        self.create_employee("u1")
+        # a sibling process on the same database, which missed the invalidations
+        other = Site("default", make_engine(str(self.engine.url)), {})
+
+        async def tap(site):
+            async with site.sqla() as session:
+                await database_stuff(
+                    "u1",
+                    session,
+                    cache=site.settings["employee_cache"],
+                    writer=site.settings["writer"],
+                    registry=site.settings["auth_registry"],
+                )
+
+        try:
+            self.io_loop.run_sync(lambda: tap(self.site))
+            self.io_loop.run_sync(lambda: tap(other))
+            # still caches the entry the other process closed
+            self.io_loop.run_sync(lambda: tap(self.site))
+            # still caches the employee as checked out
+            self.io_loop.run_sync(lambda: tap(other))
+        finally:
+            self.io_loop.run_sync(other.close)
+
+        entries = self.time_clocks("u1")
+        self.assertEqual(len(entries), 2)
+        self.assertTrue(all(entry.check_out is not None for entry in entries))
+        self.assertLessEqual(entries[0].check_out, entries[1].check_in)
+        self.assertAlmostEqual(
+            sum(self.worked("u1").values()), sum(entry.total for entry in entries)
+        )